@@ -0,0 +1,80 @@
+'''
+Compare the hyphenation throughput of the pattern automaton with and without
+dense transition tables.
+
+Usage: python benchmarks/bench_automaton.py [LANGUAGE ...] [--words FILE] [--dense N]
+
+Languages default to all installed dictionaries; nothing is downloaded.
+Words are taken from FILE or, by default, from the documentation of this
+repository. States with at least N transitions (default: 8) get a dense
+transition table, which dictionaries do not have by default.
+'''
+
+import argparse
+import glob
+import os
+import re
+import time
+
+from hyphen import dictools, hnj
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_words(path=None):
+    if path:
+        paths = [path]
+    else:
+        root = os.path.dirname(HERE)
+        paths = glob.glob(os.path.join(root, 'docs', '*.rst')) + [
+            os.path.join(root, 'README.rst'), os.path.join(root, 'LICENSE.txt')]
+    words = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            words.extend(w.lower() for w in re.findall(r'[^\W\d_]{4,}', f.read()))
+    return words
+
+
+def words_per_second(hyphenators, words, repeat=15):
+    '''
+    Return the best throughput of each hyphenator. Runs are interleaved so
+    that all hyphenators see the same machine load.
+    '''
+    best = [float('inf')] * len(hyphenators)
+    for _ in range(repeat):
+        for i, hyphenator in enumerate(hyphenators):
+            start = time.perf_counter()
+            hyphenator.apply_batch(words, 0)
+            best[i] = min(best[i], time.perf_counter() - start)
+    return [len(words) / elapsed for elapsed in best]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('languages', nargs='*')
+    parser.add_argument('--words')
+    parser.add_argument('--directory')
+    parser.add_argument('--dense', type=int, default=8)
+    args = parser.parse_args()
+
+    words = load_words(args.words)
+    dictionaries = dictools.Dictionaries(args.directory)
+    languages = args.languages or dictionaries.installed_languages()
+    seen = set()
+    print(f'{len(words)} words')
+    print(f'{"dictionary":<24}{"linear":>12}{"dense":>12}{"speedup":>9}')
+    for language in languages:
+        path = dictionaries.filepath(language)
+        if path in seen:
+            continue
+        seen.add(path)
+        linear = hnj.hyphenator_(hnj.dictionary_(path, 0), 2, 2, 2, 2)
+        dense = hnj.hyphenator_(hnj.dictionary_(path, args.dense), 2, 2, 2, 2)
+        assert linear.apply_batch(words, 1) == dense.apply_batch(words, 1)
+        before, after = words_per_second([linear, dense], words)
+        print(f'{os.path.basename(path):<24}{before:>12,.0f}{after:>12,.0f}{after / before:>8.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+'''
+Benchmark suite for PyHyphen.
+
+Usage: python benchmarks/bench_hyphen.py [--output FILE] [--compare FILE]
+
+Measures
+  - per-word latency of Hyphenator.pairs, syllables and wrap by mode,
+  - throughput of the batch methods,
+  - load time of each installed dictionary, parsed and precompiled,
+  - throughput of textwrap2.fill on a text of several megabytes.
+
+Only installed dictionaries are used; nothing is downloaded. Results are
+written as JSON. --compare prints the ratio of each result to those of an
+earlier run, e.g. of the previous release.
+'''
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+import hyphen
+from hyphen import Hyphenator, dictools, hnj, textwrap2
+
+from bench_automaton import load_words
+
+
+def best_time(func, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_words(h, words):
+    '''Per-word latency in nanoseconds of the single-word methods.'''
+    upper = [word.upper() for word in words]
+    cases = {
+        'pairs': (h.pairs, words),
+        'pairs_upper': (h.pairs, upper),
+        'syllables': (h.syllables, words),
+        'syllables_upper': (h.syllables, upper),
+        'wrap': (lambda word: h.wrap(word, 8), words),
+    }
+    results = {}
+    for name, (method, args) in cases.items():
+        elapsed = best_time(lambda: [method(word) for word in args])
+        results[name + '_ns'] = elapsed / len(args) * 1e9
+    return results
+
+
+def bench_batch(h, words):
+    '''Throughput in words per second of the batch methods.'''
+    return {
+        name + '_words_per_s': len(words) / best_time(lambda: method(words))
+        for name, method in (('pairs_many', h.pairs_many),
+            ('syllables_many', h.syllables_many))
+    }
+
+
+def bench_load(directory):
+    '''Load time in milliseconds of each installed dictionary.'''
+    dictionaries = dictools.Dictionaries(directory)
+    results = {}
+    temp_dir = tempfile.mkdtemp(prefix='pyhyphen-bench')
+    try:
+        for language in dictionaries.installed_languages():
+            path = dictionaries.filepath(language)
+            name = os.path.basename(path)
+            if name in results:
+                continue
+            compiled = os.path.join(temp_dir, name + dictools.COMPILED_EXTENSION)
+            hnj.dictionary_(path).save_binary(compiled)
+            results[name] = {
+                'parse_ms': best_time(lambda: hnj.dictionary_(path), repeat=3) * 1e3,
+                'mmap_ms': best_time(lambda: hnj.dictionary_(compiled), repeat=3) * 1e3,
+            }
+    finally:
+        shutil.rmtree(temp_dir)
+    return results
+
+
+def bench_fill(h, words, size):
+    '''Throughput in MB per second of textwrap2.fill.'''
+    text = ' '.join(words)
+    text = (text + '\n\n') * (size // len(text) + 1)
+    text = text[:size]
+    results = {'text_bytes': len(text)}
+    for width in (30, 70):
+        elapsed = best_time(lambda: textwrap2.fill(text, width=width, use_hyphenator=h), repeat=1)
+        results[f'fill_width_{width}_mb_per_s'] = len(text) / elapsed / 1e6
+    elapsed = best_time(lambda: textwrap2.fill(text, width=70, use_hyphenator=h,
+        break_mode='optimal'), repeat=1)
+    results['fill_optimal_width_70_mb_per_s'] = len(text) / elapsed / 1e6
+    return results
+
+
+def compare(results, baseline, prefix=''):
+    for key, value in results.items():
+        old = baseline.get(key) if isinstance(baseline, dict) else None
+        if isinstance(value, dict):
+            compare(value, old or {}, prefix + key + '.')
+        elif isinstance(value, float) and old:
+            print(f'{prefix + key:<60}{old:>14.1f}{value:>14.1f}{value / old:>8.2f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--language', default='en_US')
+    parser.add_argument('--directory', help='dictionary directory (default: user data directory)')
+    parser.add_argument('--words', help='text file from which words are taken')
+    parser.add_argument('--size', type=int, default=2 * 2 ** 20, help='size of the text to fill in bytes')
+    parser.add_argument('--output', help='write results to this JSON file (default: stdout)')
+    parser.add_argument('--compare', help='JSON file of an earlier run to compare with')
+    args = parser.parse_args()
+
+    if not dictools.is_installed(args.language, directory=args.directory):
+        sys.exit(f'No dictionary installed for {args.language}. '
+                 'Install it with hyphen.dictools.install first.')
+    h = Hyphenator(args.language, directory=args.directory)
+    words = load_words(args.words)
+
+    results = {
+        'meta': {
+            'hyphen_version': hyphen.__version__,
+            'python': sys.version.split()[0],
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'language': args.language,
+            'words': len(words),
+        },
+        'words': bench_words(h, words),
+        'batch': bench_batch(h, words),
+        'load': bench_load(args.directory),
+        'fill': bench_fill(h, words, args.size),
+    }
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f'\n{"benchmark":<60}{"baseline":>14}{"current":>14}{"ratio":>8}')
+        compare(results, baseline)
+
+
+if __name__ == '__main__':
+    main()
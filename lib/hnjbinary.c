@@ -0,0 +1,388 @@
+/* PyHyphen - precompiled hyphenation dictionaries
+ *
+ * File layout (native byte order, all offsets relative to the file start):
+ *
+ *   HnjHeader                    magic, version, layout checks and levels
+ *   HnjLevel ...                 one record per dictionary level
+ *   HnjState[num_states] ...     states of each level
+ *   HyphenTrans[] and strings    transitions, matches, replacements and
+ *                                NOHYPHEN lists referenced by the states
+ *   '\0'                         terminates any string running off the end
+ *
+ * Loading a file maps it read-only. Transition tables and strings are used
+ * in place; only the HyphenDict and HyphenState arrays are allocated.
+ * A precompiled dictionary may also be stored at an offset aligned to 8 bytes
+ * within a larger file such as an uncompressed zip member.
+ */
+#include <stdlib.h>
+#include <stdio.h>
+#include <string.h>
+
+#if defined(_WIN32)
+#include <windows.h>
+#else
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+#endif
+
+#include "hnjalloc.h"
+#include "hnjbinary.h"
+
+#define HNJ_MAGIC "HNJBDIC"
+#define HNJ_VERSION 1
+#define HNJ_BYTE_ORDER 0x01020304
+#define HNJ_MAX_LEVELS 2
+#define HNJ_NULL 0xffffffffU
+
+typedef struct {
+  char magic[8];
+  unsigned int version;
+  unsigned int byte_order;
+  unsigned int sizeof_trans;
+  unsigned int num_levels;
+  unsigned int size;
+  unsigned int levels[HNJ_MAX_LEVELS];
+} HnjHeader;
+
+typedef struct {
+  char cset[MAX_NAME];
+  char lhmin, rhmin, clhmin, crhmin;
+  int utf8;
+  int num_states;
+  int nohyphenl;
+  unsigned int nohyphen;
+  unsigned int states;
+} HnjLevel;
+
+typedef struct {
+  unsigned int match;
+  unsigned int repl;
+  unsigned int trans;
+  int fallback_state;
+  int num_trans;
+  signed char replindex;
+  signed char replcut;
+} HnjState;
+
+/* ---------------------------------------------------------------- */
+/* writing */
+
+typedef struct {
+  char *data;
+  size_t size;
+  size_t allocated;
+} HnjBuffer;
+
+/* reserve 'size' zeroed bytes aligned to 8 bytes. Return their offset. */
+static size_t
+hnj_buffer_reserve (HnjBuffer *buf, size_t size)
+{
+  size_t offset = (buf->size + 7) & ~(size_t) 7;
+  if (offset + size > buf->allocated) {
+    while (offset + size > buf->allocated) buf->allocated *= 2;
+    buf->data = (char *) hnj_realloc (buf->data, buf->allocated);
+  }
+  memset (buf->data + buf->size, 0, offset + size - buf->size);
+  buf->size = offset + size;
+  return offset;
+}
+
+static unsigned int
+hnj_buffer_append (HnjBuffer *buf, const void *data, size_t size)
+{
+  size_t offset;
+  if (!data) return HNJ_NULL;
+  offset = hnj_buffer_reserve (buf, size);
+  memcpy (buf->data + offset, data, size);
+  return (unsigned int) offset;
+}
+
+/* byte length of the NUL-separated NOHYPHEN list including the last NUL */
+static size_t
+hnj_nohyphen_size (HyphenDict *dict)
+{
+  size_t size = 0;
+  int i;
+  for (i = 0; i <= dict->nohyphenl; i++)
+    size += strlen (dict->nohyphen + size) + 1;
+  return size;
+}
+
+int
+hnj_hyphen_save_binary (HyphenDict *dict, const char *fn)
+{
+  HnjBuffer buf;
+  HyphenDict *levels[HNJ_MAX_LEVELS];
+  size_t header, level_offsets[HNJ_MAX_LEVELS], states;
+  int num_levels, k, i, result = 0;
+  FILE *f;
+
+  for (num_levels = 0; dict && num_levels < HNJ_MAX_LEVELS; num_levels++) {
+    levels[num_levels] = dict;
+    dict = dict->nextlevel;
+  }
+
+  buf.allocated = 1 << 16;
+  buf.size = 0;
+  buf.data = (char *) hnj_malloc (buf.allocated);
+
+  header = hnj_buffer_reserve (&buf, sizeof(HnjHeader));
+  for (k = 0; k < num_levels; k++)
+    level_offsets[k] = hnj_buffer_reserve (&buf, sizeof(HnjLevel));
+
+  for (k = 0; k < num_levels; k++) {
+    HyphenDict *d = levels[k];
+    HnjLevel level;
+
+    memcpy (level.cset, d->cset, MAX_NAME);
+    level.lhmin = d->lhmin;
+    level.rhmin = d->rhmin;
+    level.clhmin = d->clhmin;
+    level.crhmin = d->crhmin;
+    level.utf8 = d->utf8;
+    level.num_states = d->num_states;
+    level.nohyphenl = d->nohyphenl;
+    level.nohyphen = d->nohyphen ?
+      hnj_buffer_append (&buf, d->nohyphen, hnj_nohyphen_size (d)) : HNJ_NULL;
+    states = hnj_buffer_reserve (&buf, d->num_states * sizeof(HnjState));
+    level.states = (unsigned int) states;
+    memcpy (buf.data + level_offsets[k], &level, sizeof(HnjLevel));
+
+    for (i = 0; i < d->num_states; i++) {
+      HyphenState *hstate = &d->states[i];
+      HnjState state;
+
+      state.match = hstate->match ?
+        hnj_buffer_append (&buf, hstate->match, strlen (hstate->match) + 1) : HNJ_NULL;
+      state.repl = hstate->repl ?
+        hnj_buffer_append (&buf, hstate->repl, strlen (hstate->repl) + 1) : HNJ_NULL;
+      state.trans = hstate->num_trans ?
+        hnj_buffer_append (&buf, hstate->trans, hstate->num_trans * sizeof(HyphenTrans)) : HNJ_NULL;
+      state.fallback_state = hstate->fallback_state;
+      state.num_trans = hstate->num_trans;
+      state.replindex = hstate->replindex;
+      state.replcut = hstate->replcut;
+      memcpy (buf.data + states + i * sizeof(HnjState), &state, sizeof(HnjState));
+    }
+  }
+  hnj_buffer_reserve (&buf, 1);
+
+  {
+    HnjHeader h;
+    memset (&h, 0, sizeof(HnjHeader));
+    memcpy (h.magic, HNJ_MAGIC, sizeof(h.magic));
+    h.version = HNJ_VERSION;
+    h.byte_order = HNJ_BYTE_ORDER;
+    h.sizeof_trans = sizeof(HyphenTrans);
+    h.num_levels = num_levels;
+    h.size = (unsigned int) buf.size;
+    for (k = 0; k < num_levels; k++)
+      h.levels[k] = (unsigned int) level_offsets[k];
+    memcpy (buf.data + header, &h, sizeof(HnjHeader));
+  }
+
+  f = fopen (fn, "wb");
+  if (f == NULL) {
+    result = -1;
+  } else {
+    if (fwrite (buf.data, 1, buf.size, f) != buf.size) result = -1;
+    if (fclose (f)) result = -1;
+  }
+  hnj_free (buf.data);
+  return result;
+}
+
+/* ---------------------------------------------------------------- */
+/* loading */
+
+int
+hnj_hyphen_is_binary (const char *fn)
+{
+  char magic[8];
+  int result = 0;
+  FILE *f = fopen (fn, "rb");
+  if (f == NULL) return 0;
+  if (fread (magic, 1, sizeof(magic), f) == sizeof(magic))
+    result = (memcmp (magic, HNJ_MAGIC, sizeof(magic)) == 0);
+  fclose (f);
+  return result;
+}
+
+/* map 'size' bytes at 'offset' of the file 'fn', or all bytes from 'offset'
+   to the end of the file if 'size' is 0. Return a pointer to the byte at
+   'offset' and set 'size' to the number of bytes mapped from there.
+   The mapping itself starts at the page boundary '*base' and is '*base_size'
+   bytes long. Return NULL on error. */
+static char *
+hnj_map (const char *fn, size_t offset, size_t *size, char **base, size_t *base_size)
+{
+  char *mapping = NULL;
+  size_t start;
+#if defined(_WIN32)
+  HANDLE file, map;
+  LARGE_INTEGER file_size;
+  SYSTEM_INFO info;
+
+  GetSystemInfo (&info);
+  start = offset - offset % info.dwAllocationGranularity;
+  file = CreateFileA (fn, GENERIC_READ, FILE_SHARE_READ, NULL,
+    OPEN_EXISTING, FILE_ATTRIBUTE_NORMAL, NULL);
+  if (file == INVALID_HANDLE_VALUE) return NULL;
+  if (GetFileSizeEx (file, &file_size)
+      && (unsigned long long) file_size.QuadPart > offset) {
+    unsigned long long rest = (unsigned long long) file_size.QuadPart - offset;
+    if (*size == 0) *size = (size_t) rest;
+    if (*size <= rest) {
+      map = CreateFileMappingA (file, NULL, PAGE_READONLY, 0, 0, NULL);
+      if (map) {
+        mapping = (char *) MapViewOfFile (map, FILE_MAP_READ,
+          (DWORD) ((unsigned long long) start >> 32), (DWORD) (start & 0xffffffffU),
+          offset - start + *size);
+        CloseHandle (map);
+      }
+    }
+  }
+  CloseHandle (file);
+#else
+  struct stat st;
+  int fd;
+
+  start = offset - offset % (size_t) sysconf (_SC_PAGESIZE);
+  fd = open (fn, O_RDONLY);
+  if (fd < 0) return NULL;
+  if (fstat (fd, &st) == 0 && (unsigned long long) st.st_size > offset) {
+    unsigned long long rest = (unsigned long long) st.st_size - offset;
+    if (*size == 0) *size = (size_t) rest;
+    if (*size <= rest) {
+      mapping = (char *) mmap (NULL, offset - start + *size, PROT_READ, MAP_SHARED,
+        fd, (off_t) start);
+      if (mapping == MAP_FAILED) mapping = NULL;
+    }
+  }
+  close (fd);
+#endif
+  if (!mapping) return NULL;
+  *base = mapping;
+  *base_size = offset - start + *size;
+  return mapping + (offset - start);
+}
+
+void
+hnj_hyphen_unmap (void *mapping, size_t size)
+{
+#if defined(_WIN32)
+  UnmapViewOfFile (mapping);
+#else
+  munmap (mapping, size);
+#endif
+}
+
+/* check that 'count' items of 'size' bytes at 'offset' lie within the file */
+static int
+hnj_in_bounds (unsigned int offset, size_t count, size_t size, size_t file_size)
+{
+  return offset <= file_size && count <= (file_size - offset) / size;
+}
+
+static void
+hnj_free_levels (HyphenDict **levels, int num_levels)
+{
+  int k;
+  for (k = 0; k < num_levels; k++) {
+    if (levels[k]->states) hnj_free (levels[k]->states);
+    hnj_free (levels[k]);
+  }
+}
+
+HyphenDict *
+hnj_hyphen_load_binary (const char *fn)
+{
+  return hnj_hyphen_load_binary_at (fn, 0, 0);
+}
+
+HyphenDict *
+hnj_hyphen_load_binary_at (const char *fn, size_t offset, size_t size)
+{
+  HyphenDict *levels[HNJ_MAX_LEVELS];
+  const HnjHeader *h;
+  char *mapping, *base;
+  size_t base_size = 0;
+  int num_levels = 0, k, i, j;
+
+  /* offsets within the image are aligned relative to its start */
+  if (offset % 8) return NULL;
+  if (!(mapping = hnj_map (fn, offset, &size, &base, &base_size))) return NULL;
+
+  h = (const HnjHeader *) mapping;
+  if (size < sizeof(HnjHeader) || memcmp (h->magic, HNJ_MAGIC, sizeof(h->magic))
+      || h->version != HNJ_VERSION || h->byte_order != HNJ_BYTE_ORDER
+      || h->sizeof_trans != sizeof(HyphenTrans) || h->size != size
+      || h->num_levels < 1 || h->num_levels > HNJ_MAX_LEVELS
+      || mapping[size - 1] != '\0')
+    goto fail;
+
+  for (k = 0; k < (int) h->num_levels; k++) {
+    const HnjLevel *level = (const HnjLevel *) (mapping + h->levels[k]);
+    const HnjState *states;
+    HyphenDict *d;
+
+    if (!hnj_in_bounds (h->levels[k], 1, sizeof(HnjLevel), size)
+        || level->num_states < 1
+        || !hnj_in_bounds (level->states, level->num_states, sizeof(HnjState), size)
+        || (level->nohyphen != HNJ_NULL && level->nohyphen >= size))
+      goto fail;
+
+    d = levels[num_levels++] = (HyphenDict *) hnj_malloc (sizeof(HyphenDict));
+    memcpy (d->cset, level->cset, MAX_NAME);
+    d->cset[MAX_NAME - 1] = '\0';
+    d->lhmin = level->lhmin;
+    d->rhmin = level->rhmin;
+    d->clhmin = level->clhmin;
+    d->crhmin = level->crhmin;
+    d->utf8 = level->utf8;
+    d->num_states = level->num_states;
+    d->nohyphenl = level->nohyphenl;
+    d->nohyphen = level->nohyphen == HNJ_NULL ? NULL : mapping + level->nohyphen;
+    d->nextlevel = NULL;
+    d->dense = NULL;
+    d->mapping = base;
+    d->mapping_size = 0;
+    d->states = (HyphenState *) hnj_malloc (d->num_states * sizeof(HyphenState));
+
+    states = (const HnjState *) (mapping + level->states);
+    for (i = 0; i < d->num_states; i++) {
+      const HnjState *state = &states[i];
+      HyphenState *hstate = &d->states[i];
+
+      if ((state->match != HNJ_NULL && state->match >= size)
+          || (state->repl != HNJ_NULL && state->repl >= size)
+          || state->num_trans < 0
+          || (state->num_trans && !hnj_in_bounds (state->trans, state->num_trans, sizeof(HyphenTrans), size))
+          || state->fallback_state < -1 || state->fallback_state >= d->num_states)
+        goto fail;
+      hstate->match = state->match == HNJ_NULL ? NULL : mapping + state->match;
+      hstate->repl = state->repl == HNJ_NULL ? NULL : mapping + state->repl;
+      hstate->replindex = state->replindex;
+      hstate->replcut = state->replcut;
+      hstate->fallback_state = state->fallback_state;
+      hstate->num_trans = state->num_trans;
+      hstate->trans = state->num_trans ? (HyphenTrans *) (mapping + state->trans) : NULL;
+      hstate->dense = NULL;
+      for (j = 0; j < hstate->num_trans; j++)
+        if (hstate->trans[j].new_state < 0 || hstate->trans[j].new_state >= d->num_states)
+          goto fail;
+    }
+  }
+
+  for (k = 0; k + 1 < num_levels; k++) levels[k]->nextlevel = levels[k + 1];
+  /* the first level owns the mapping */
+  levels[0]->mapping_size = base_size;
+  return levels[0];
+
+fail:
+  hnj_free_levels (levels, num_levels);
+  hnj_hyphen_unmap (base, base_size);
+  return NULL;
+}
@@ -0,0 +1,34 @@
+/* PyHyphen - precompiled hyphenation dictionaries
+ *
+ * A precompiled dictionary is a flat image of the pattern automaton built by
+ * hnj_hyphen_load. It is loaded by mapping the file read-only into memory,
+ * so no patterns need to be parsed, and processes loading the same file
+ * share its pages.
+ *
+ * The format is native to the platform that wrote it. Files written on a
+ * platform with a different byte order or struct layout are rejected by
+ * hnj_hyphen_load_binary.
+ */
+#ifndef __HNJBINARY_H__
+#define __HNJBINARY_H__
+
+#include "hyphen.h"
+
+/* write 'dict' to the file 'fn'. Return 0 on success, -1 on error. */
+int hnj_hyphen_save_binary (HyphenDict *dict, const char *fn);
+
+/* return 1 if 'fn' is a precompiled dictionary, 0 otherwise */
+int hnj_hyphen_is_binary (const char *fn);
+
+/* map the precompiled dictionary 'fn'. Return NULL on error. */
+HyphenDict *hnj_hyphen_load_binary (const char *fn);
+
+/* map the precompiled dictionary stored in the 'size' bytes at 'offset' of
+   the file 'fn'. 'offset' must be a multiple of 8. If 'size' is 0, the
+   dictionary extends to the end of the file. Return NULL on error. */
+HyphenDict *hnj_hyphen_load_binary_at (const char *fn, size_t offset, size_t size);
+
+/* unmap the memory of a precompiled dictionary */
+void hnj_hyphen_unmap (void *mapping, size_t size);
+
+#endif /* __HNJBINARY_H__ */
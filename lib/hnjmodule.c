@@ -1,8 +1,10 @@
 #define PY_SSIZE_T_CLEAN
-#define Py_LIMITED_API 0x03070000 
+/* Py_LIMITED_API is defined by setup.py except on free-threaded builds,
+   which do not support the limited API. */
 #include "Python.h"
 #include "structmember.h"
 #include "hyphen.h"
+#include "hnjbinary.h"
 #include "string.h"
 
 /* String constants for calls of Py_Unicode_FromEncodedObject etc.*/
@@ -10,17 +12,35 @@ static const char unicode_errors[] = "strict";
 
 
 
+/* Default threshold for dense transition tables. They are off by default:
+   benchmarks/bench_automaton.py shows no consistent gain on the installed
+   dictionaries, while building them slows down loading. */
+#define DENSE_MIN_TRANS 0
+
 /* is raised if hnj_hyphen returns an error while trying to hyphenate a word*/
 static PyObject *ErrorObject;
 
+/* is raised if a word is too long to be hyphenated. It is a ValueError. */
+static PyObject *TooLongObject;
+
 /* ----------------------------------------------------- */
 
-/* Declarations for objects of type hyphenator_ */
+/* Declarations for objects of type dictionary_ and hyphenator_ */
+
+/* type object owning a loaded hyphenation dictionary. It is never modified
+after loading, so any number of hyphenator_ objects and threads may share it. */
+typedef struct {
+    PyObject_HEAD
+    HyphenDict *dict;
+} Dictobject;
+
+static PyObject *Dict_type;
 
-/* type object to store the hyphenation dictionary. Its only method is 'apply' which calls the
-core function 'hnj_hyphenate2'' from the wrapped library 'hnj_hyphen-2.3' */
+/* type object to apply a hyphenation dictionary. Its main method is 'apply' which calls the
+core function 'hnj_hyphenate3'' from the wrapped library 'hnj_hyphen-2.3' */
 typedef struct {
     PyObject_HEAD
+    PyObject *dictionary;   /* the dictionary_ object owning 'dict' */
     HyphenDict *dict;
     int lmin, rmin, compound_lmin, compound_rmin;
 } HyDictobject;
@@ -38,11 +58,18 @@ word: must be lower-cased to be hyphenated correctly. Through the flags in mode,
         lower-cased or upper-cased.  Capital letters are restored \n\
         according to the value of 'mode'. The encoded representation of 'word'\n\
         may have at most 100 bytes including the terminating '\0'.\n\
-mode: the 3 least significant bits are interpreted as flags with the following meaning:\n\
+mode: the 4 least significant bits are interpreted as flags with the following meaning:\n\
         - mode & 1 = 0: return a string with '=' inserted at the hyphenation points\n\
         - mode & 1 = 1: return a list of lists of the form [before_hyphen, after_hyphen]\n\
         - mode & 2 = 1: return a capitalized word\n\
-        - mode & 4 = 1: return an title-cased word\n";
+        - mode & 4 = 1: return an title-cased word\n\
+        - mode & 8 = 1: return a list of syllables (ignored if mode & 1 = 1)\n\
+        - mode & 16 = 1: lower-case the word before hyphenating it, and give the results\n\
+          the case of 'word' rather than applying mode & 2 or mode & 4. Mixed-case words\n\
+          such as 'McDonald' keep their case. Replacements of non-standard\n\
+          hyphenations are upper-cased or capitalized as the characters they replace.\n\
+          Words whose length str.lower changes, such as 'İSTANBUL', are upper-cased\n\
+          or capitalized as a whole. Words containing '=' are hyphenated as they are.\n";
 
 /* get a pointer to the nth 8-bit or UTF-8 character of the word */
 /* This is required because some operations are done at utf8 string level. */
@@ -57,201 +84,1185 @@ static char * hindex(char * word, int n, int utf8) {
 }
 
 
-/* Depending on the value of 'mode', convert a  C string to PyUnicode, handle also
-    capitalization and upper case words. */
-static PyObject * prepare_result(char *word, char *encoding, unsigned char mode)
+/* Names of str methods and the separator, created once by hnj_modexec. */
+static PyObject *str_title, *str_upper, *str_lower, *separator_u;
+
+/* Internal bit of 'mode': the word was lower-cased to another length. */
+#define MODE_RECASE 32
+
+
+/* Restore capital letters of the unicode obj 'word' according to 'mode'.
+   The reference to 'word' is stolen. */
+static PyObject * apply_case(PyObject *word, unsigned char mode)
 {
-    PyObject *result, *temp;
-    
-    /* first convert the C string to unicode. */
-    if (!(temp = PyUnicode_Decode(word, strlen(word), encoding, unicode_errors)))
+    PyObject *result;
+
+    if (!(mode & 6) || !word)
+        return word;
+    /* title-cased or upper-cased */
+    result = PyObject_CallMethodObjArgs(word, (mode & 4) ? str_title : str_upper, NULL);
+    Py_DECREF(word);
+    return result;
+}
+
+
+/* Decode a C string of 'size' bytes in the encoding of 'dict'. UTF-8 and ASCII
+   are decoded directly rather than through a codec looked up by name.
+   The 8-bit charsets of hyphenation dictionaries all extend ASCII. */
+static PyObject * decode(HyphenDict *dict, const char *word, Py_ssize_t size)
+{
+    Py_ssize_t i;
+
+    if (dict->utf8)
+        return PyUnicode_DecodeUTF8(word, size, unicode_errors);
+    for (i = 0; i < size && !(word[i] & 0x80); i++);
+    if (i == size)
+        return PyUnicode_DecodeASCII(word, size, unicode_errors);
+    return PyUnicode_Decode(word, size, dict->cset, unicode_errors);
+}
+
+
+/* Depending on the value of 'mode', convert a  C string of 'size' bytes to PyUnicode,
+    handle also capitalization and upper case words. */
+static PyObject * prepare_result(const char *word, Py_ssize_t size, HyphenDict *dict, unsigned char mode)
+{
+    return apply_case(decode(dict, word, size), mode);
+}
+
+
+/* Return the list [s1, s2]. The references to 's1' and 's2' are stolen. */
+static PyObject * make_pair(PyObject *s1, PyObject *s2)
+{
+    PyObject *result = NULL;
+
+    if (s1 && s2 && (result = PyList_New(2)))
+    {
+        PyList_SetItem(result, 0, s1);
+        PyList_SetItem(result, 1, s2);
+        return result;
+    }
+    Py_XDECREF(s1);
+    Py_XDECREF(s2);
+    return NULL;
+}
+
+
+/* Return 'text' with its first character upper-cased.
+   The reference to 'text' is stolen. */
+static PyObject *
+capitalize(PyObject *text)
+{
+    PyObject *first, *rest, *result = NULL;
+
+    if (!text) return NULL;
+    first = apply_case(PyUnicode_Substring(text, 0, 1), 2);
+    if (first && (rest = PyUnicode_Substring(text, 1, PyUnicode_GetLength(text))))
+    {
+        result = PyUnicode_Concat(first, rest);
+        Py_DECREF(rest);
+    }
+    Py_XDECREF(first);
+    Py_DECREF(text);
+    return result;
+}
+
+
+/* Return 1 if the str 'word' equals 'word'.upper(), and 0 otherwise.
+   Return -1 if an exception was raised. */
+static int
+is_upper(PyObject *word)
+{
+    PyObject *upper;
+    int cmp;
+
+    if (!word || !(upper = PyObject_CallMethodObjArgs(word, str_upper, NULL)))
+        return -1;
+    cmp = PyUnicode_Compare(word, upper);
+    Py_DECREF(upper);
+    if (PyErr_Occurred()) return -1;
+    return cmp == 0;
+}
+
+
+/* Return the replacement 'text' for characters 'start' to 'end' of 'word_u',
+   given lower-cased as 'low'. 'text' is upper-cased if these characters are
+   all upper-case, and capitalized if only the first one is. A replacement
+   longer than the characters it replaces is upper-cased only if as many
+   characters of 'word_u' from 'start' are, e.g. 'sz' for 'S' in 'ASszonnyal'
+   is capitalized. The reference to 'text' is stolen. */
+static PyObject *
+case_like(PyObject *text, PyObject *word_u, PyObject *low, Py_ssize_t start, Py_ssize_t end)
+{
+    PyObject *span;
+    Py_ssize_t length;
+    int upper;
+
+    if (!text) return NULL;
+    if ((length = PyUnicode_GetLength(text)) < 1
+        || PyUnicode_ReadChar(word_u, start) == PyUnicode_ReadChar(low, start))
+        /* lower-case, or the first character is not upper-case */
+        return text;
+    if (end < start + length)
+        end = Py_MIN(start + length, PyUnicode_GetLength(word_u));
+    span = PyUnicode_Substring(word_u, start, end);
+    upper = is_upper(span);
+    Py_XDECREF(span);
+    if (upper < 0)
+    {
+        Py_DECREF(text);
+        return NULL;
+    }
+    if (upper)
+        return apply_case(text, 2);
+    return capitalize(text);
+}
+
+
+/* Return [before_hyphen, after_hyphen] from the C string 'word' of 'size' bytes
+   in which the first '=' marks the hyphen position. */
+static PyObject * split_pair(const char *word, Py_ssize_t size, HyphenDict *dict, unsigned char mode)
+{
+    PyObject *s1, *result;
+
+    if (!(s1 = prepare_result(word, size, dict, mode)))
+        return NULL;
+    result = PyUnicode_Split(s1, separator_u, 1);
+    Py_DECREF(s1);
+    return result;
+}
+
+
+/* Return s1 + s2. The references to 's1' and 's2' are stolen. */
+static PyObject * concat(PyObject *s1, PyObject *s2)
+{
+    PyObject *result = NULL;
+
+    if (s1 && s2)
+        result = PyUnicode_Concat(s1, s2);
+    Py_XDECREF(s1);
+    Py_XDECREF(s2);
+    return result;
+}
+
+
+/* Return the pair for the non-standard hyphenation at the 'j'-th character
+   of the encoded word 'word_str' of 'wd_size' bytes. If mode & 16, the pair
+   is built from 'word_u' and its lower-cased copy 'low' as described in
+   HyDict_apply__doc__. */
+static PyObject *
+nonstandard_pair(HyDictobject *self, PyObject *word_u, PyObject *low,
+    const char *word_str, size_t wd_size,
+    size_t j, const char *rep, int pos, int cut, unsigned char mode)
+{
+    char buffer[3 * MAX_CHARS];
+    char *hyphenated_word = buffer;
+    const char *separator = strchr(rep, '=');
+    size_t k, tail, rep_size, size;
+    Py_ssize_t start = (Py_ssize_t) j - pos + 1;
+    PyObject *result;
+
+    if ((mode & 16) && separator)
+        return make_pair(
+            concat(PyUnicode_Substring(word_u, 0, start),
+                case_like(decode(self->dict, rep, separator - rep), word_u, low, start, start + cut)),
+            concat(case_like(decode(self->dict, separator + 1, strlen(separator + 1)),
+                    word_u, low, start, start + cut),
+                PyUnicode_Substring(word_u, start + cut, PyUnicode_GetLength(word_u))));
+
+    /* do the replacement by joining the three substrings: */
+    k = hindex((char *) word_str, j - pos + 1, self->dict->utf8) - word_str;
+    tail = hindex((char *) word_str + k, cut, self->dict->utf8) - word_str;
+    rep_size = strlen(rep);
+    size = k + rep_size + (wd_size - tail);
+    if (size > sizeof(buffer) && !(hyphenated_word = PyMem_Malloc(size)))
+        return PyErr_NoMemory();
+    memcpy(hyphenated_word, word_str, k);
+    memcpy(hyphenated_word + k, rep, rep_size);
+    memcpy(hyphenated_word + k + rep_size, word_str + tail, wd_size - tail);
+    result = split_pair(hyphenated_word, size, self->dict, mode);
+    if (hyphenated_word != buffer) PyMem_Free(hyphenated_word);
+    return result;
+}
+
+
+/* Replace the str at 'i' in 'list' by its upper-cased copy if 'upper' is
+   true, and else by its capitalized copy. Return -1 on error. */
+static int
+recase_item(PyObject *list, Py_ssize_t i, int upper)
+{
+    PyObject *item = PyList_GetItem(list, i);
+
+    if (!item) return -1;
+    Py_INCREF(item);
+    item = upper ? apply_case(item, 2) : capitalize(item);
+    if (!item) return -1;
+    return PyList_SetItem(list, i, item);
+}
+
+
+/* Give the result of hyphenate_word for the lower-cased 'word_u' the case of
+   'word_u': all strings are upper-cased if 'word_u' is upper-case, and the
+   first piece is capitalized if only its first character is upper-case.
+   'mode' is that of the result. The reference to 'result' is stolen. */
+static PyObject *
+recase(PyObject *result, PyObject *word_u, unsigned char mode)
+{
+    PyObject *first, *lower;
+    Py_ssize_t i;
+    int upper, failed = 0;
+
+    if (!result) return NULL;
+    if ((upper = is_upper(word_u)) < 0)
+        goto fail;
+    if (!upper)
+    {
+        /* is the first character upper-case? */
+        if (!(first = PyUnicode_Substring(word_u, 0, 1)))
+            goto fail;
+        lower = PyObject_CallMethodObjArgs(first, str_lower, NULL);
+        failed = !lower || (PyUnicode_Compare(first, lower) == 0 && !PyErr_Occurred());
+        Py_DECREF(first);
+        Py_XDECREF(lower);
+        if (PyErr_Occurred()) goto fail;
+        if (failed) return result;
+    }
+    if (!(mode & 9))
+        return upper ? apply_case(result, 2) : capitalize(result);
+    for (i = 0; i < PyList_Size(result) && !failed; i++)
+    {
+        if (mode & 1)
+            /* the first string of each pair, or both if upper-case */
+            failed = recase_item(PyList_GetItem(result, i), 0, upper)
+                || (upper && recase_item(PyList_GetItem(result, i), 1, upper));
+        else if (upper || i == 0)
+            failed = recase_item(result, i, upper);
+    }
+    if (!failed) return result;
+ fail:
+    Py_DECREF(result);
+    return NULL;
+}
+
+
+/* Free the arrays hnj_hyphen_hyphenate3 allocates for non-standard hyphenations */
+static void
+free_nonstandard(char **rep, int *pos, int *cut, size_t wd_size)
+{
+    size_t i;
+
+    if (rep)
+    {
+        for (i = 0; i < wd_size; i++) free(rep[i]);
+        free(rep);
+    }
+    free(pos);
+    free(cut);
+}
+
+
+/* Run hnj_hyphen_hyphenate3 on the encoded word 'word_str' of 'wd_size' bytes.
+   'hyphens' must have room for MAX_CHARS + 5 bytes, 'hyphenated_word', if not NULL,
+   for 3 * MAX_CHARS bytes. Return 0 on success. On error, set an exception
+   and return -1. */
+static int
+find_hyphens(HyDictobject *self, const char *word_str, size_t wd_size,
+    char *hyphens, char *hyphenated_word, char ***rep, int **pos, int **cut)
+{
+    int failed;
+
+    /* now actually try the hyphenation. The dictionary is never modified
+       after loading, and libhyphen keeps no global state. So other threads
+       may run while this one is in pure C code. */
+    Py_BEGIN_ALLOW_THREADS
+    failed = hnj_hyphen_hyphenate3(self->dict, word_str, wd_size, hyphens,
+        hyphenated_word, rep, pos, cut,
+        self->lmin, self->rmin, self->compound_lmin, self->compound_rmin);
+    Py_END_ALLOW_THREADS
+    if (failed)
+    {
+        free_nonstandard(*rep, *pos, *cut, wd_size);
+        *rep = NULL; *pos = *cut = NULL;
+        PyErr_SetString(ErrorObject, "Cannot hyphenate word.");
+        return -1;
+    }
+    return 0;
+}
+
+
+/* Return the number of characters of the encoded word 'word_str' */
+static size_t
+count_chars(HyDictobject *self, const char *word_str, size_t wd_size)
+{
+    size_t i, nchars;
+
+    if (!self->dict->utf8) return wd_size;
+    for (i = 0, nchars = 0; i < wd_size; i++)
+        nchars += ((((unsigned char) word_str[i]) >> 6) != 2);
+    return nchars;
+}
+
+
+/* Return 'word_u' with '=' inserted at its hyphenation points and non-standard
+   hyphenations replaced, i.e. 'hyphenated_word' as built by libhyphen from the
+   lower-cased 'word_str', but with the case of 'word_u' as described in
+   HyDict_apply__doc__. If 'hyphenated_word' is not built as expected, e.g.
+   as libhyphen overlaps replacements, it is given the case of the word as a whole. */
+static PyObject *
+restore_hyphenated(HyDictobject *self, PyObject *word_u, PyObject *low,
+    const char *word_str, size_t wd_size, const char *hyphens,
+    char **rep, int *pos, int *cut, const char *hyphenated_word)
+{
+    size_t offsets[MAX_CHARS + 1], i, end, seg, nchars, rep_size, size = 0;
+    size_t hw_size = strlen(hyphenated_word);
+    const char *separator;
+    PyObject *result, *piece;
+
+    /* byte offsets of the characters of 'word_str' */
+    nchars = count_chars(self, word_str, wd_size);
+    for (i = 0, offsets[0] = 0; i < nchars; i++)
+    {
+        offsets[i + 1] = offsets[i] + 1;
+        while (self->dict->utf8 && ((((unsigned char) word_str[offsets[i + 1]]) >> 6) == 2))
+            offsets[i + 1]++;
+    }
+    if (!(result = PyUnicode_FromStringAndSize(NULL, 0)))
         return NULL;
-    if (mode & 4) { /* title-cased */
-        if (!(result = PyObject_CallMethod(temp, "title", NULL)))
+    for (i = 0, seg = 0; i + 1 < nchars; i++)
+    {
+        if (!(hyphens[i] & 1)) continue;
+        end = i + 1;
+        separator = "=";
+        if (rep && rep[i])
         {
-            Py_DECREF(temp);
-            return NULL;
-      };
+            if ((int) i + 1 < pos[i] || cut[i] < 0) goto whole_word;
+            end = i + 1 - pos[i];
+            separator = rep[i];
+            if (end < seg || end + cut[i] <= i || end + cut[i] > nchars) goto whole_word;
         }
-    else
-    {
-        if (mode & 2) { /* upper-cased */
-            if (!(result = PyObject_CallMethod(temp, "upper", NULL)))
-            {
-                Py_DECREF(temp);
-                return NULL;
-        };
+        /* compare with 'hyphenated_word' as we go */
+        rep_size = strlen(separator);
+        if (size + offsets[end] - offsets[seg] + rep_size > hw_size
+            || memcmp(hyphenated_word + size, word_str + offsets[seg], offsets[end] - offsets[seg])
+            || memcmp(hyphenated_word + size + offsets[end] - offsets[seg], separator, rep_size))
+            goto whole_word;
+        size += offsets[end] - offsets[seg] + rep_size;
+        piece = PyUnicode_Substring(word_u, seg, end);
+        if (rep && rep[i])
+        {
+            result = concat(result, piece);
+            piece = case_like(decode(self->dict, rep[i], rep_size), word_u, low, end, end + cut[i]);
+            seg = end + cut[i];
+            i = seg - 1;
         }
         else
-        { 
-        /* return the word unchanged as unicode obj */
-            return temp;
+        {
+            result = concat(result, piece);
+            Py_INCREF(separator_u);
+            piece = separator_u;
+            seg = end;
         }
+        if (!(result = concat(result, piece))) return NULL;
     }
-    /* Delete temp when it is not returned (see above */
-    Py_DECREF(temp);
-    /* return the uppercased or titlecased result as unicode obj */
+    if (strcmp(hyphenated_word + size, word_str + offsets[seg]))
+        goto whole_word;
+    return concat(result, PyUnicode_Substring(word_u, seg, nchars));
+
+ whole_word:
+    Py_XDECREF(result);
+    if (!(low = decode(self->dict, word_str, wd_size)))
+        return NULL;
+    result = case_like(decode(self->dict, hyphenated_word, hw_size), word_u, low, 0, nchars);
+    Py_DECREF(low);
     return result;
 }
 
 
-/* core function of the hyphenator_ object type */
+/* core function of the hyphenator_ object type. Hyphenate the encoded word
+   'word_str' of length 'wd_size' bytes. 'word_str' must be NUL-terminated.
+   'word_u' is the str object encoded as 'word_str', or NULL. It is sliced
+   into pairs rather than decoding 'word_str'. If mode & 16, 'word_str' is
+   'word_u' lower-cased, and 'word_u' must not be NULL. If mode & MODE_RECASE,
+   'word_str' is 'word_u' lower-cased to another number of characters, and the
+   results are given the case of 'word_u' by recase.
+   All buffers live on the stack, so no memory is allocated for the word
+   apart from the Python objects returned. */
 static PyObject *
-HyDict_apply(HyDictobject *self, PyObject *args)
+hyphenate_word(HyDictobject *self, PyObject *word_u, const char *word_str, size_t wd_size,
+    unsigned char mode)
 {
-    const char separator[] = "=";
-    char  *hyphenated_word, *hyphens, *word_str;
+    char hyphens[MAX_CHARS + 5], hyphenated_word[3 * MAX_CHARS];
     char ** rep = NULL;
-    char r;
     int * pos = NULL;
     int * cut = NULL;
-    unsigned char mode;
-    size_t wd_size, i, j, k;
+    size_t j, k, nchars;
     Py_ssize_t hyph_count;
-    PyObject *result, *s1, *s2, *separator_u = NULL;
+    PyObject *result, *word, *low = NULL, *s1, *s2;
 /* mode:
    bit0 === 1: return a tuple, otherwise a word with '=' inserted at the positions of possible hyphenations.
    bit1 == 1: word must be capitalized before returning
-  bit2 == 1: entire word must be uppered before returning  */
+  bit2 == 1: entire word must be uppered before returning
+  bit3 == 1: return a list of syllables rather than a word with inserted '='
+  bit4 == 1: 'word_str' is lower-cased, results take the case of 'word_u'
+  bit5 == 1: MODE_RECASE */
 
 
-    /* parse and check arguments */
-    if (!PyArg_ParseTuple(args, "esb", &self->dict->cset, &word_str, &mode))
-          return NULL;
-    wd_size = strlen(word_str);
     if (wd_size >= MAX_CHARS)
     {
-        PyErr_SetString(PyExc_ValueError, "Word to be hyphenated may have at most 100 characters.");
-        PyMem_Free(word_str);
+        PyErr_SetString(TooLongObject, "Word to be hyphenated may have at most 100 characters.");
         return NULL;
     }
 
-    /* allocate memory for the return values of the core function hnj_hyphenate3*/
-    hyphens = (char *) PyMem_Malloc(wd_size + 5);
-    hyphenated_word = (char *) PyMem_Malloc(wd_size * 3);
-    /* now actually try the hyphenation*/
-    if (hnj_hyphen_hyphenate3(self->dict, word_str, wd_size, hyphens,
-        hyphenated_word, &rep, &pos, &cut,
-        self->lmin, self->rmin, self->compound_lmin, self->compound_rmin))
-    {
-        PyMem_Free(hyphens);
-        PyMem_Free(hyphenated_word);
-        PyMem_Free(word_str);
-        PyErr_SetString(ErrorObject, "Cannot hyphenate word.");
+    if (mode & MODE_RECASE)
+        return recase(hyphenate_word(self, NULL, word_str, wd_size, mode & 15), word_u, mode);
+    if (find_hyphens(self, word_str, wd_size, hyphens, hyphenated_word, &rep, &pos, &cut))
         return NULL;
-    }
-    /* Count possible hyphenations. This is done by checking bit 0 of each */
-    /* char of 'hyphens' which is 0 if and only if the word can be hyphened */
-    /* at that position. Then proceed to */
-    /* the real work, i.d. returning a unicode object with inserted '=' at each */
-    /* possible hyphenation, or return a list of lists of two unicode objects */
-    /* representing a possible hyphenation each. Note that the string */
-    /* is useful only in languages without non-standard hyphenation, as */
-    /* the string could contain more than one replacement, whereas */
-    /* we are only interested in one replacement at the hyphenation position */
-    /* we choose. */
-    /* If no hyphenations were found, a string with 0 inserted '=', i.e. the original word, */
-    /* or an empty list (with 0 pairs) is returned. */
-    hyph_count = 0;
-    for (i=0; (i+1) < strlen(hyphens); i++)
+    /* The lower-cased word is needed to restore the case of replacements */
+    if ((mode & 16) && rep && !(low = decode(self->dict, word_str, wd_size)))
     {
-        if (hyphens[i] & 1) hyph_count++;
+        free_nonstandard(rep, pos, cut, wd_size);
+        return NULL;
     }
     /* Do we need to return a string with inserted '=', or a list of pairs? */
     if (!(mode & 1))
     {
         /* Prepare for returning a unicode obj of the form 'before_hyphen=after_hyphen.  */
-        if (!(result = prepare_result(hyphenated_word, self->dict->cset, mode)))
+        if (mode & 16)
+            result = apply_case(restore_hyphenated(self, word_u, low, word_str, wd_size,
+                hyphens, rep, pos, cut, hyphenated_word), mode);
+        else
+            result = prepare_result(hyphenated_word, strlen(hyphenated_word), self->dict, mode);
+        Py_XDECREF(low);
+        free_nonstandard(rep, pos, cut, wd_size);
+        /* Split the word into syllables at the '=' if requested. */
+        if (result && (mode & 8))
         {
-            PyMem_Free(hyphenated_word);
-            PyMem_Free(word_str);
-            PyMem_Free(hyphens);
-            return NULL;
+            s1 = result;
+            result = PyUnicode_Split(s1, separator_u, -1);
+            Py_DECREF(s1);
+        }
+        return result;
+    }
+
+    /* construct a list of lists of two unicode objects. Each inner list */
+    /* represents a possible hyphenation. 'hyphens' has one entry per */
+    /* character. Bit 0 of an entry is set if and only if the word can be */
+    /* hyphenated after that character. If no hyphenations are found, */
+    /* an empty list is returned. */
+    nchars = count_chars(self, word_str, wd_size);
+    hyph_count = 0;
+    for (j = 0; j + 1 < nchars; j++)
+        if (hyphens[j] & 1) hyph_count++;
+    if (!(result = PyList_New(hyph_count)) || !hyph_count)
+    {
+        Py_XDECREF(low);
+        free_nonstandard(rep, pos, cut, wd_size);
+        return result;
+    }
+
+    /* The word is decoded only once. Each pair of a standard hyphenation */
+    /* consists of two slices of it. A word containing '=' is passed */
+    /* through the slow path, which splits at the first '='. */
+    word = NULL;
+    if (!memchr(word_str, '=', wd_size))
+    {
+        if (word_u)
+        {
+            Py_INCREF(word_u);
+            word = word_u;
+        }
+        else if (!(word = decode(self->dict, word_str, wd_size)))
+            goto fail;
+    }
+
+    /* now fill the resulting list from left to right with the pairs */
+    hyph_count = 0;
+    for (j = 0, k = 0; j + 1 < nchars; j++)
+    {
+        /* byte offset of character j + 1 */
+        k++;
+        while (self->dict->utf8 && ((((unsigned char) word_str[k]) >> 6) == 2)) k++;
+
+        /* Is here a hyphen? */
+        if (!(hyphens[j] & 1)) continue;
+
+        if (rep && rep[j])
+            /* first, handle non-standard hyphenation with replacement. */
+            s2 = nonstandard_pair(self, word_u, low, word_str, wd_size, j, rep[j], pos[j], cut[j], mode);
+        else if (word)
+            /* slice the word in case of standard hyphenation */
+            s2 = make_pair(apply_case(PyUnicode_Substring(word, 0, j + 1), mode),
+                apply_case(PyUnicode_Substring(word, j + 1, nchars), mode));
+        else
+        {
+            /* Insert an '=' so that the string has the same format as in the */
+            /* non-standard case, and split it at the first '='. */
+            memcpy(hyphenated_word, word_str, k);
+            hyphenated_word[k] = '=';
+            memcpy(hyphenated_word + k + 1, word_str + k, wd_size - k);
+            s2 = split_pair(hyphenated_word, wd_size + 1, self->dict, mode);
+        }
+        if (!s2) goto fail;
+        PyList_SetItem(result, hyph_count++, s2);
+    }
+    Py_XDECREF(word);
+    Py_XDECREF(low);
+    free_nonstandard(rep, pos, cut, wd_size);
+    return result;
+
+ fail:
+    Py_XDECREF(word);
+    Py_XDECREF(low);
+    Py_DECREF(result);
+    free_nonstandard(rep, pos, cut, wd_size);
+    return NULL;
+}
+
+
+/* Encode the 'length' characters 'chars' to 'buffer' of MAX_CHARS bytes as
+   UTF-8 if 'utf8' is true, or else as ASCII, which all 8-bit charsets of
+   hyphenation dictionaries extend. Return the size of the NUL-terminated result,
+   or -1 if a character cannot be encoded this way or the result may not fit. */
+static Py_ssize_t
+encode_chars(const Py_UCS4 *chars, Py_ssize_t length, int utf8, char *buffer)
+{
+    Py_ssize_t i, size = 0;
+    unsigned char *out = (unsigned char *) buffer;
+    Py_UCS4 c;
+
+    for (i = 0; i < length; i++)
+    {
+        c = chars[i];
+        if (size + 4 >= MAX_CHARS) return -1;
+        if (c < 0x80)
+            out[size++] = (unsigned char) c;
+        else if (!utf8 || (c >= 0xd800 && c < 0xe000))
+            /* leave the error for surrogates to the codec */
+            return -1;
+        else if (c < 0x800)
+        {
+            out[size++] = 0xc0 | (c >> 6);
+            out[size++] = 0x80 | (c & 0x3f);
+        }
+        else if (c < 0x10000)
+        {
+            out[size++] = 0xe0 | (c >> 12);
+            out[size++] = 0x80 | ((c >> 6) & 0x3f);
+            out[size++] = 0x80 | (c & 0x3f);
+        }
+        else
+        {
+            out[size++] = 0xf0 | (c >> 18);
+            out[size++] = 0x80 | ((c >> 12) & 0x3f);
+            out[size++] = 0x80 | ((c >> 6) & 0x3f);
+            out[size++] = 0x80 | (c & 0x3f);
+        }
+    }
+    out[size] = '\0';
+    return size;
+}
+
+/* Encode the str 'word' in the encoding of the dictionary. Set 'word_str' to the
+   NUL-terminated result in 'buffer' of MAX_CHARS bytes. The characters are
+   copied and encoded by encode_chars rather than by a codec, using only the
+   limited API of Python 3.7. Return its size. Raise WordTooLongError if it
+   has MAX_CHARS bytes or more, and UnicodeEncodeError if 'word' is not
+   encodable. Return -1 on error. */
+static Py_ssize_t
+encode_word(HyDictobject *self, PyObject *word, char *buffer, const char **word_str)
+{
+    Py_UCS4 chars[MAX_CHARS];
+    Py_ssize_t length, size = -1;
+    PyObject *encoded;
+
+    if ((length = PyUnicode_GetLength(word)) < 0) return -1;
+    if (length < MAX_CHARS)
+    {
+        /* copy the characters and encode them without allocating memory */
+        if (!PyUnicode_AsUCS4(word, chars, MAX_CHARS, 0)) return -1;
+        size = encode_chars(chars, length, self->dict->utf8, buffer);
+        *word_str = buffer;
+    }
+    if (size < 0)
+    {
+        /* other characters of 8-bit charsets, and errors */
+        if (!(encoded = PyUnicode_AsEncodedString(word, self->dict->cset, unicode_errors)))
+            return -1;
+        size = PyBytes_Size(encoded);
+        if (size < MAX_CHARS) memcpy(buffer, PyBytes_AsString(encoded), size + 1);
+        Py_DECREF(encoded);
+        *word_str = buffer;
+    }
+    if (size >= MAX_CHARS)
+    {
+        PyErr_SetString(TooLongObject, "Word to be hyphenated may have at most 100 characters.");
+        return -1;
+    }
+    return size;
+}
+
+
+/* Encode the str 'word' lower-cased into 'buffer' as by encode_word.
+   ASCII words are lower-cased in 'buffer', others by str.lower. If str.lower
+   changes the length of the word, such as of one with a dotted capital I,
+   the lower-cased word is encoded and '*recase' is set to 1, so that its
+   results must be given the case of 'word' by recase. If 'recase' is NULL,
+   such a word is encoded as it is, so that each character of 'word_str' is
+   one of 'word'. */
+static Py_ssize_t
+encode_lower(HyDictobject *self, PyObject *word, char *buffer, const char **word_str,
+    int *recase)
+{
+    Py_ssize_t size, i;
+    PyObject *lowered;
+
+    if ((size = encode_word(self, word, buffer, word_str)) >= 0)
+    {
+        for (i = 0; i < size && !((*word_str)[i] & 0x80); i++);
+        if (i == size)
+        {
+            for (i = 0; i < size && !((*word_str)[i] >= 'A' && (*word_str)[i] <= 'Z'); i++);
+            if (i == size) return size;
+            if (*word_str != buffer)
+            {
+                memcpy(buffer, *word_str, size + 1);
+                *word_str = buffer;
+            }
+            for (; i < size; i++)
+                if (buffer[i] >= 'A' && buffer[i] <= 'Z') buffer[i] += 'a' - 'A';
+            return size;
+        }
+    }
+    else if (PyErr_ExceptionMatches(PyExc_UnicodeError))
+        /* the lower-cased word may be encodable */
+        PyErr_Clear();
+    else
+        return -1;
+
+    if (!(lowered = PyObject_CallMethodObjArgs(word, str_lower, NULL)))
+        return -1;
+    if (PyUnicode_GetLength(lowered) != PyUnicode_GetLength(word))
+    {
+        if (!recase)
+        {
+            Py_DECREF(lowered);
+            return encode_word(self, word, buffer, word_str);
         }
-        PyMem_Free(hyphenated_word);
+        *recase = 1;
+    }
+    /* 'buffer' must hold the word when 'lowered' is gone */
+    if ((size = encode_word(self, lowered, buffer, word_str)) >= 0 && *word_str != buffer)
+    {
+        memcpy(buffer, *word_str, size + 1);
+        *word_str = buffer;
     }
+    Py_DECREF(lowered);
+    return size;
+}
+
+
+static PyObject *
+HyDict_apply(HyDictobject *self, PyObject *args)
+{
+    char buffer[MAX_CHARS];
+    const char *word_str;
+    Py_ssize_t size;
+    unsigned char mode;
+    int recase = 0;
+    PyObject *word;
+
+    /* parse and check arguments */
+    if (!PyArg_ParseTuple(args, "Ub", &word, &mode))
+          return NULL;
+    mode &= ~MODE_RECASE;
+    /* A word with '=' is hyphenated as it is. */
+    if ((mode & 16) && PyUnicode_FindChar(word, '=', 0, PyUnicode_GetLength(word), 1) != -1)
+        mode &= ~16;
+    if (mode & 16)
+        size = encode_lower(self, word, buffer, &word_str, &recase);
     else
+        size = encode_word(self, word, buffer, &word_str);
+    if (size < 0)
+        return NULL;
+    if (recase)
+        mode |= MODE_RECASE;
+    if ((size_t) size != strlen(word_str))
+    {
+        PyErr_SetString(PyExc_TypeError, "argument 1 must be encoded string without null bytes, not str");
+        return NULL;
+    }
+    return hyphenate_word(self, word, word_str, size, mode);
+}
+
+
+static char HyDict_apply_batch__doc__[] =
+"SUMMARY:\n\
+apply_batch(words: iterable of unicode objects, mode: int[, skipped: dict]) -> list of results\n\n\
+Hyphenate all words in a single call. 'mode' has the same meaning as in 'apply'.\n\
+Unlike 'apply', each word is preprocessed as in the hyphen.hyphenator class:\n\
+        - words shorter than 4 characters or containing a '=' are not hyphenated,\n\
+        - words are lower-cased, and the results keep their case as if bit 4\n\
+          of mode was set,\n\
+        - words not encodable to the dictionary's encoding are not hyphenated.\n\
+The result for a word that is not hyphenated is an empty list if mode & 9 != 0,\n\
+and the unchanged word otherwise.\n\
+If the dict 'skipped' is given, the numbers of words not hyphenated are stored\n\
+in it under the keys 'rejected' (short words and words containing '='),\n\
+'encode_errors' and 'too_long'. The other batch methods accept it as well.\n";
+
+/* Indices into the counts of skipped words, and their keys in 'skipped' */
+enum {SKIP_REJECTED, SKIP_UNENCODABLE, SKIP_TOO_LONG, SKIP_REASONS};
+static const char *skip_keys[SKIP_REASONS] = {"rejected", "encode_errors", "too_long"};
+
+/* Store the nonzero counts of skipped words in the dict 'skipped' unless it is
+   NULL or None. Return -1 if an exception was raised. */
+static int
+report_skipped(PyObject *skipped, const Py_ssize_t *counts)
+{
+    PyObject *value;
+    int i, failed;
+
+    if (!skipped || skipped == Py_None) return 0;
+    if (!PyDict_Check(skipped))
+    {
+        PyErr_SetString(PyExc_TypeError, "skipped must be a dict.");
+        return -1;
+    }
+    for (i = 0; i < SKIP_REASONS; i++)
+    {
+        if (!counts[i]) continue;
+        if (!(value = PyLong_FromSsize_t(counts[i]))) return -1;
+        failed = PyDict_SetItemString(skipped, skip_keys[i], value);
+        Py_DECREF(value);
+        if (failed) return -1;
+    }
+    return 0;
+}
+
+
+/* Return the result for a word that is not to be hyphenated. */
+static PyObject *
+unhyphenated_result(PyObject *word, unsigned char mode)
+{
+    if (mode & 9) return PyList_New(0);
+    Py_INCREF(word);
+    return word;
+}
+
+/* Preprocess one word of a batch as described in HyDict_apply_batch__doc__,
+   and encode it as by encode_lower. Bit 4 of 'mode' is set, and 'word_u' is
+   set to a new reference to the word. Unless 'aligned' is true, a word whose
+   length str.lower changes is lower-cased, and MODE_RECASE is set in 'mode'.
+   Return the size of the encoded word, SKIP_WORD if the word is not to be
+   hyphenated, or -1 if an exception was raised. Words of MAX_CHARS bytes or
+   more raise WordTooLongError, or are skipped if 'skip_long' is true.
+   Skipped words are counted in 'skips' by reason. */
+#define SKIP_WORD -2
+
+static Py_ssize_t
+encode_item(HyDictobject *self, PyObject *word, char *buffer, const char **word_str,
+    PyObject **word_u, unsigned char *mode, int skip_long, int aligned, Py_ssize_t *skips)
+{
+    Py_ssize_t length, size;
+    int recase = 0;
+
+    if (!PyUnicode_Check(word))
+    {
+        PyErr_Format(PyExc_TypeError, "str expected, %R given.", (PyObject *)Py_TYPE(word));
+        return -1;
+    }
+    /* Discard very short words and words with explicit hyphenation points. */
+    if ((length = PyUnicode_GetLength(word)) < 0) return -1;
+    if (length < 4 || PyUnicode_FindChar(word, '=', 0, length, 1) != -1)
     {
-    PyMem_Free(hyphenated_word);
-        /* construct a list of lists of two unicode objects. Each inner list */
-        /* represents a possible hyphenation. */
+        skips[SKIP_REJECTED]++;
+        return SKIP_WORD;
+    }
+
+    if ((size = encode_lower(self, word, buffer, word_str, aligned ? NULL : &recase)) < 0)
+    {
+        if (PyErr_ExceptionMatches(PyExc_UnicodeError))
+            skips[SKIP_UNENCODABLE]++;
+        else if (skip_long && PyErr_ExceptionMatches(TooLongObject))
+            skips[SKIP_TOO_LONG]++;
+        else
+            return -1;
+        PyErr_Clear();
+        return SKIP_WORD;
+    }
+    Py_INCREF(word);
+    *word_u = word;
+    *mode |= recase ? 16 | MODE_RECASE : 16;
+    return size;
+}
+
+/* Preprocess and hyphenate one word of a batch. */
+static PyObject *
+hyphenate_item(HyDictobject *self, PyObject *word, unsigned char mode, Py_ssize_t *skips)
+{
+    char buffer[MAX_CHARS];
+    const char *word_str;
+    Py_ssize_t size;
+    PyObject *word_u, *result;
+
+    if ((size = encode_item(self, word, buffer, &word_str, &word_u, &mode, 0, 0, skips)) == SKIP_WORD)
+        return unhyphenated_result(word, mode);
+    if (size < 0) return NULL;
+    result = hyphenate_word(self, word_u, word_str, size, mode);
+    Py_DECREF(word_u);
+    return result;
+}
 
+static PyObject *
+HyDict_apply_batch(HyDictobject *self, PyObject *args)
+{
+    PyObject *words, *iterator, *word, *item, *results, *skipped = NULL;
+    Py_ssize_t skips[SKIP_REASONS] = {0};
+    unsigned char mode;
 
-        /* First create the outer list. Each element will be a list of two strings or unicode objects. */
-        if (!(result = PyList_New(hyph_count)))
+    if (!PyArg_ParseTuple(args, "Ob|O", &words, &mode, &skipped))
+        return NULL;
+    if (!(iterator = PyObject_GetIter(words)))
+        return NULL;
+    if (!(results = PyList_New(0)))
+    {
+        Py_DECREF(iterator);
+        return NULL;
+    }
+    while ((word = PyIter_Next(iterator)))
+    {
+        item = hyphenate_item(self, word, mode, skips);
+        Py_DECREF(word);
+        if (!item || PyList_Append(results, item))
         {
-            PyMem_Free(hyphens);
-            PyMem_Free(word_str);
+            Py_XDECREF(item);
+            Py_DECREF(iterator);
+            Py_DECREF(results);
             return NULL;
-        };
-        /* now fill the resulting list from left to right with the pairs */
-        j=0; hyph_count = 0;
-        /* The following is needed to split the word (in which an '=' indicates the */
-        /* hyphen position) */
-        separator_u = PyUnicode_Decode(separator, 1, self->dict->cset, unicode_errors);
-        for (i = 0; (i + 1) < strlen(word_str); i++)
+        }
+        Py_DECREF(item);
+    }
+    Py_DECREF(iterator);
+    if (PyErr_Occurred() || report_skipped(skipped, skips))
+    {
+        Py_DECREF(results);
+        return NULL;
+    }
+    return results;
+}
+
+
+static char HyDict_positions__doc__[] =
+"SUMMARY:\n\
+positions(words: iterable of unicode objects, nonstandard: bool[, skipped: dict]) -> (offsets: bytes, index: bytes, replacements: dict)\n\n\
+Find the hyphenation points of all words without creating a str object per point.\n\
+Words are preprocessed as in 'apply_batch'. A hyphenation point is given by its\n\
+offset, i.e. the number of characters before the hyphen.\n\
+offsets: the offsets of all words as native unsigned shorts\n\
+index: len(words) + 1 native unsigned ints. The offsets of the i-th word are\n\
+        offsets[index[i]:index[i + 1]].\n\
+Points of non-standard hyphenation are skipped unless 'nonstandard' is true.\n\
+In that case, 'replacements' maps (i, offset) to (start, end, before, after) for\n\
+each of them: characters start to end of the word are replaced by 'before'\n\
+at the end of the line and 'after' at the beginning of the next line.\n";
+
+/* Append the non-standard hyphenation at the 'j'-th character to 'replacements'.
+   'before' and 'after' get the case of the characters they replace in 'word_u',
+   given lower-cased as 'low'. */
+static int
+add_replacement(HyDictobject *self, PyObject *replacements, Py_ssize_t item,
+    PyObject *word_u, PyObject *low, size_t j, const char *rep, int pos, int cut)
+{
+    const char *separator = strchr(rep, '=');
+    Py_ssize_t split = separator ? separator - rep : (Py_ssize_t) strlen(rep);
+    Py_ssize_t start = (Py_ssize_t) j - pos + 1;
+    PyObject *key, *value;
+    int failed;
+
+    if (!(value = Py_BuildValue("nnNN", start, start + cut,
+            case_like(decode(self->dict, rep, split), word_u, low, start, start + cut),
+            case_like(decode(self->dict, rep + split + (separator != NULL),
+                strlen(rep + split + (separator != NULL))), word_u, low, start, start + cut))))
+        return -1;
+    if (!(key = Py_BuildValue("nn", item, (Py_ssize_t) j + 1)))
+    {
+        Py_DECREF(value);
+        return -1;
+    }
+    failed = PyDict_SetItem(replacements, key, value);
+    Py_DECREF(key);
+    Py_DECREF(value);
+    return failed;
+}
+
+static PyObject *
+HyDict_positions(HyDictobject *self, PyObject *args)
+{
+    char buffer[MAX_CHARS], hyphens[MAX_CHARS + 5];
+    const char *word_str;
+    char ** rep;
+    int * pos;
+    int * cut;
+    unsigned short *offsets = NULL, *new_offsets;
+    unsigned int *index = NULL, *new_index;
+    size_t j, nchars, count = 0, capacity = 0, items = 0, index_capacity = 0;
+    Py_ssize_t size;
+    unsigned char mode;
+    int nonstandard, failed;
+    Py_ssize_t skips[SKIP_REASONS] = {0};
+    PyObject *words, *iterator, *word, *word_u, *low, *replacements, *result = NULL;
+    PyObject *skipped = NULL;
+
+    if (!PyArg_ParseTuple(args, "Op|O", &words, &nonstandard, &skipped))
+        return NULL;
+    if (!(iterator = PyObject_GetIter(words)))
+        return NULL;
+    if (!(replacements = PyDict_New()))
+    {
+        Py_DECREF(iterator);
+        return NULL;
+    }
+    while (1)
+    {
+        /* grow the arrays geometrically; a word has fewer than MAX_CHARS points */
+        if (items + 2 > index_capacity)
+        {
+            index_capacity = 2 * index_capacity + 64;
+            if (!(new_index = PyMem_Realloc(index, index_capacity * sizeof(*index))))
+            {
+                PyErr_NoMemory();
+                goto done;
+            }
+            index = new_index;
+        }
+        if (count + MAX_CHARS > capacity)
+        {
+            capacity = 2 * capacity + 4 * MAX_CHARS;
+            if (!(new_offsets = PyMem_Realloc(offsets, capacity * sizeof(*offsets))))
+            {
+                PyErr_NoMemory();
+                goto done;
+            }
+            offsets = new_offsets;
+        }
+        index[items] = (unsigned int) count;
+        if (!(word = PyIter_Next(iterator))) break;
+        mode = 0;
+        size = encode_item(self, word, buffer, &word_str, &word_u, &mode, 0, 1, skips);
+        Py_DECREF(word);
+        if (size == SKIP_WORD)
+        {
+            items++;
+            continue;
+        }
+        if (size < 0) goto done;
+        rep = NULL; pos = cut = NULL;
+        low = NULL;
+        failed = find_hyphens(self, word_str, size, hyphens, NULL, &rep, &pos, &cut)
+            || (nonstandard && rep && !(low = decode(self->dict, word_str, size)));
+        nchars = failed ? 0 : count_chars(self, word_str, size);
+        for (j = 0; j + 1 < nchars && !failed; j++)
+        {
+            if (!(hyphens[j] & 1)) continue;
+            if (rep && rep[j])
+            {
+                /* non-standard hyphenation: the word is changed */
+                if (!nonstandard) continue;
+                failed = add_replacement(self, replacements, items,
+                    word_u, low, j, rep[j], pos[j], cut[j]);
+            }
+            offsets[count++] = (unsigned short) (j + 1);
+        }
+        Py_XDECREF(low);
+        Py_DECREF(word_u);
+        free_nonstandard(rep, pos, cut, size);
+        if (failed) goto done;
+        items++;
+    }
+    if (!PyErr_Occurred() && !report_skipped(skipped, skips))
+        result = Py_BuildValue("y#y#O", (char *) offsets, (Py_ssize_t) (count * sizeof(*offsets)),
+            (char *) index, (Py_ssize_t) ((items + 1) * sizeof(*index)), replacements);
+ done:
+    PyMem_Free(offsets);
+    PyMem_Free(index);
+    Py_DECREF(replacements);
+    Py_DECREF(iterator);
+    return result;
+}
+
+
+static char HyDict_syllable_counts__doc__[] =
+"SUMMARY:\n\
+syllable_counts(words: iterable of unicode objects[, skipped: dict]) -> bytes\n\n\
+Count the syllables of all words without creating a str object per syllable.\n\
+Words are preprocessed as in 'apply_batch'. The i-th byte is the number of\n\
+syllables of the i-th word, i.e. the length of apply(word, 8). It is 0 for\n\
+the words apply_batch returns [] for in mode 8, and for words too long to be\n\
+hyphenated rather than raising ValueError.\n";
+
+static PyObject *
+HyDict_syllable_counts(HyDictobject *self, PyObject *args)
+{
+    char buffer[MAX_CHARS], hyphens[MAX_CHARS + 5], hyphenated_word[3 * MAX_CHARS];
+    const char *word_str, *c;
+    char ** rep;
+    int * pos;
+    int * cut;
+    unsigned char *counts = NULL, *new_counts, mode;
+    size_t items = 0, capacity = 0;
+    Py_ssize_t size;
+    int failed;
+    Py_ssize_t skips[SKIP_REASONS] = {0};
+    PyObject *words, *iterator, *word, *word_u, *result = NULL, *skipped = NULL;
+
+    if (!PyArg_ParseTuple(args, "O|O", &words, &skipped))
+        return NULL;
+    if (!(iterator = PyObject_GetIter(words)))
+        return NULL;
+    while ((word = PyIter_Next(iterator)))
+    {
+        if (items + 1 > capacity)
+        {
+            capacity = 2 * capacity + 256;
+            if (!(new_counts = PyMem_Realloc(counts, capacity)))
+            {
+                Py_DECREF(word);
+                PyErr_NoMemory();
+                goto done;
+            }
+            counts = new_counts;
+        }
+        mode = 0;
+        size = encode_item(self, word, buffer, &word_str, &word_u, &mode, 1, 0, skips);
+        Py_DECREF(word);
+        counts[items] = 0;
+        if (size == SKIP_WORD)
         {
-            /* i-th character utf8? Then just increment i */
-            if (self->dict->utf8 && ((((unsigned char) word_str[i]) >> 6) == 2)) continue;
+            items++;
+            continue;
+        }
+        if (size < 0) goto done;
+        rep = NULL; pos = cut = NULL;
+        failed = find_hyphens(self, word_str, size, hyphens, hyphenated_word, &rep, &pos, &cut);
+        Py_DECREF(word_u);
+        free_nonstandard(rep, pos, cut, size);
+        if (failed) goto done;
+        /* one syllable more than hyphens, including those of replacements */
+        counts[items] = 1;
+        for (c = hyphenated_word; (c = strchr(c, '=')); c++)
+            counts[items]++;
+        items++;
+    }
+    if (!PyErr_Occurred() && !report_skipped(skipped, skips))
+        result = PyBytes_FromStringAndSize((char *) counts, (Py_ssize_t) items);
+ done:
+    PyMem_Free(counts);
+    Py_DECREF(iterator);
+    return result;
+}
+
 
-            /* Is here a hyphen? */
-            if ((hyphens[j] & 1))
+static char HyDict_break_masks__doc__[] =
+"SUMMARY:\n\
+break_masks(words: iterable of unicode objects, nonstandard: bool[, skipped: dict]) -> (masks: bytes, index: bytes)\n\n\
+Find the hyphenation points of all words as one byte per character.\n\
+Words are preprocessed as in 'apply_batch'. A byte is 1 if the word can be\n\
+hyphenated after the character, and 0 otherwise, in particular for all\n\
+characters of the words apply_batch returns [] for, and of words too long\n\
+to be hyphenated rather than raising ValueError.\n\
+masks: the masks of all words\n\
+index: len(words) + 1 native unsigned ints. The mask of the i-th word is\n\
+        masks[index[i]:index[i + 1]], one byte per character of the word.\n\
+Points of non-standard hyphenation are 0 unless 'nonstandard' is true.\n\
+In that case they are 2.\n";
+
+static PyObject *
+HyDict_break_masks(HyDictobject *self, PyObject *args)
+{
+    char buffer[MAX_CHARS], hyphens[MAX_CHARS + 5];
+    const char *word_str;
+    char ** rep;
+    int * pos;
+    int * cut;
+    unsigned char *masks = NULL, *new_masks, mode;
+    unsigned int *index = NULL, *new_index;
+    size_t j, nchars, count = 0, capacity = 0, items = 0, index_capacity = 0;
+    Py_ssize_t size, length;
+    int nonstandard, failed;
+    Py_ssize_t skips[SKIP_REASONS] = {0};
+    PyObject *words, *iterator, *word, *word_u, *result = NULL, *skipped = NULL;
+
+    if (!PyArg_ParseTuple(args, "Op|O", &words, &nonstandard, &skipped))
+        return NULL;
+    if (!(iterator = PyObject_GetIter(words)))
+        return NULL;
+    while (1)
+    {
+        if (items + 2 > index_capacity)
+        {
+            index_capacity = 2 * index_capacity + 64;
+            if (!(new_index = PyMem_Realloc(index, index_capacity * sizeof(*index))))
+            {
+                PyErr_NoMemory();
+                goto done;
+            }
+            index = new_index;
+        }
+        index[items] = (unsigned int) count;
+        if (!(word = PyIter_Next(iterator))) break;
+        /* room for a mask per character; skipped words may be arbitrarily long */
+        if ((length = PyUnicode_Check(word) ? PyUnicode_GetLength(word) : 0) < 0)
+        {
+            Py_DECREF(word);
+            goto done;
+        }
+        if (count + (size_t) length + MAX_CHARS > capacity)
+        {
+            capacity = 2 * capacity + (size_t) length + 4 * MAX_CHARS;
+            if (!(new_masks = PyMem_Realloc(masks, capacity)))
             {
-                /* Build the hyphenated word at C string level. */
-                /* first, handle non-standard hyphenation with replacement. */
-                if (rep && rep[j])
-                {
-                    /* determine the position within word_str where to insert rep[j] */
-                    /* do the replacement by appending the three substrings: */
-                    hyphenated_word = (char *) PyMem_Malloc(strlen(word_str) + strlen(rep[j])+1);
-                    k = hindex(word_str, j - pos[j] + 1, self->dict->utf8) - word_str;
-                    r = word_str[k]; word_str[k] = 0;
-                    strcpy(hyphenated_word, word_str);
-                    strcat(hyphenated_word, rep[j]);
-                    word_str[k] = r;
-                    strcat(hyphenated_word, hindex(word_str + k, cut[j], self->dict->utf8));
-                }
-                else
-                {
-                    /* build the word in case of standard hyphenation. */
-                    /* An '=' will be inserted so that the */
-                    /* resulting string has the same format as in the non-standard case. */
-                    hyphenated_word = (char *) PyMem_Malloc(strlen(word_str) + 2);
-                    k = hindex(word_str, j + 1, self->dict->utf8) - word_str;
-                    r = word_str[k]; word_str[k] = 0;
-                    strcpy(hyphenated_word, word_str);
-                    strcat(hyphenated_word, separator);
-                    word_str[k] = r;
-                    strcat(hyphenated_word, word_str + k);
-                }
-                /* Now prepare the resulting unicode object according to the value of mode */
-                if (!(s1 = prepare_result(hyphenated_word, self->dict->cset, mode)))
-                {
-                    PyMem_Free(hyphenated_word);
-                    PyMem_Free(hyphens);
-                    PyMem_Free(word_str);
-                    return NULL;
-                }
-                PyMem_Free(hyphenated_word);
-                /* split it into two parts at the position of the '=' */
-                /* and write the resulting list into the tuple */
-                if (!((s2 = PyUnicode_Split(s1, separator_u, 1)) &&
-                    (!PyList_SetItem(result, hyph_count++, s2))))
-                {
-                    Py_XDECREF(s2);
-                    Py_DECREF(s1);
-                    PyMem_Free(hyphens);
-                    PyMem_Free(word_str);
-                    return NULL;
-                }
-                Py_DECREF(s1);
-            } /* finished with current hyphen */
-            j++;
-        } /* for loop*/
-        Py_DECREF(separator_u);
-    } /* end of else construct a list */
-    PyMem_Free(hyphens);
-    PyMem_Free(word_str);
+                Py_DECREF(word);
+                PyErr_NoMemory();
+                goto done;
+            }
+            masks = new_masks;
+        }
+        mode = 0;
+        size = encode_item(self, word, buffer, &word_str, &word_u, &mode, 1, 1, skips);
+        Py_DECREF(word);
+        if (size == SKIP_WORD)
+        {
+            memset(masks + count, 0, (size_t) length);
+            count += (size_t) length;
+            items++;
+            continue;
+        }
+        if (size < 0) goto done;
+        rep = NULL; pos = cut = NULL;
+        failed = find_hyphens(self, word_str, size, hyphens, NULL, &rep, &pos, &cut);
+        nchars = failed ? 0 : count_chars(self, word_str, size);
+        for (j = 0; j < nchars; j++)
+        {
+            if (j + 1 == nchars || !(hyphens[j] & 1))
+                masks[count++] = 0;
+            else if (rep && rep[j])
+                /* non-standard hyphenation: the word is changed */
+                masks[count++] = nonstandard ? 2 : 0;
+            else
+                masks[count++] = 1;
+        }
+        Py_DECREF(word_u);
+        free_nonstandard(rep, pos, cut, size);
+        if (failed) goto done;
+        items++;
+    }
+    if (!PyErr_Occurred() && !report_skipped(skipped, skips))
+        /* 'masks' is NULL if there are no words */
+        result = Py_BuildValue("y#y#", masks ? (char *) masks : "", (Py_ssize_t) count,
+            (char *) index, (Py_ssize_t) ((items + 1) * sizeof(*index)));
+ done:
+    PyMem_Free(masks);
+    PyMem_Free(index);
+    Py_DECREF(iterator);
     return result;
 }
 
@@ -259,6 +1270,14 @@ HyDict_apply(HyDictobject *self, PyObject *args)
 static  PyMethodDef HyDict_methods[] = {
 	{"apply",	(PyCFunction)HyDict_apply,
     METH_VARARGS,	HyDict_apply__doc__},
+	{"apply_batch",	(PyCFunction)HyDict_apply_batch,
+    METH_VARARGS,	HyDict_apply_batch__doc__},
+	{"positions",	(PyCFunction)HyDict_positions,
+    METH_VARARGS,	HyDict_positions__doc__},
+	{"syllable_counts",	(PyCFunction)HyDict_syllable_counts,
+    METH_VARARGS,	HyDict_syllable_counts__doc__},
+	{"break_masks",	(PyCFunction)HyDict_break_masks,
+    METH_VARARGS,	HyDict_break_masks__doc__},
 	{NULL, NULL}		/* sentinel */
 };
 
@@ -269,42 +1288,42 @@ static  PyMethodDef HyDict_methods[] = {
 static void
 HyDict_dealloc(HyDictobject *self)
 {
-	if (self->dict) hnj_hyphen_free(self->dict);
+	Py_XDECREF(self->dictionary);
 	    PyObject_Del(self);
 }
 
 static int
 HyDict_init(HyDictobject *self, PyObject *args) {
 
-    /* Pointer to file-path of  dict */
-    
-    #if defined(_WIN32)
-    const wchar_t * fn;
-#else
-    const char * fn;
- #endif
- 
-    if (!PyArg_ParseTuple(args, "siiii", &fn,
-    &self->lmin, &self->rmin, &self->compound_lmin, &self->compound_rmin))
-	return -1;
-    
-      if (!(self->dict = hnj_hyphen_load(fn)))
+    PyObject *dictionary;
+
+    /* Other threads may be hyphenating with the dictionary without the GIL */
+    if (self->dictionary)
     {
-          if (!PyErr_Occurred()) PyErr_SetString(PyExc_IOError, "Cannot load hyphen dictionary.");
-          Py_DECREF(fn);
+        PyErr_SetString(PyExc_RuntimeError, "hyphenator_ objects are immutable.");
         return -1;
     }
-    Py_DECREF(fn);
+    if (!PyArg_ParseTuple(args, "Oiiii", &dictionary,
+    &self->lmin, &self->rmin, &self->compound_lmin, &self->compound_rmin))
+	return -1;
+
+    /* Share a loaded dictionary, or load one from the path passed */
+    if (PyObject_IsInstance(dictionary, Dict_type) == 1)
+        Py_INCREF(dictionary);
+    else if (!(dictionary = PyObject_CallFunctionObjArgs(Dict_type, dictionary, NULL)))
+        return -1;
+    self->dictionary = dictionary;
+    self->dict = ((Dictobject *) dictionary)->dict;
     return 0;
 }
 
 
 static char HyDict_type__doc__[] =
 "Wrapper class for the hnj_hyphen library contained in this module.\n\n\
-Usage: hyphenator_(dict_file_name: string)\n\
-The init method will try to load a hyphenation dictionary with the filename passed.\n\
-If an error occurs when trying to load the dictionary, IOError is raised.\n\
-Dictionary files compatible with hnjmodule can be downloaded at the LibreOffice website.\n\n\
+Usage: hyphenator_(dictionary: dictionary_ or string, lmin, rmin, compound_lmin, compound_rmin)\n\
+'dictionary' is a loaded dictionary, or the filename of a dictionary to be loaded.\n\
+Hyphenators differing only in lmin, rmin, compound_lmin and compound_rmin\n\
+can share a single dictionary_ object.\n\
 This class should normally be instantiated only by the convenience interface provided by\n\
 the hyphen.hyphenator class.\n"
 ;
@@ -326,6 +1345,133 @@ static PyType_Spec HyDict_type_spec = {
     HyDict_type_slots,
 };
 
+/* End of code for hyphenator_ objects */
+/* -------------------------------------------------------- */
+
+/* Code for dictionary_ objects */
+
+static char Dict_save_binary__doc__[] =
+"SUMMARY:\n\
+save_binary(path: str) -> None\n\n\
+Write the dictionary to 'path' as a precompiled dictionary. Passing such a file\n\
+to the constructor maps it into memory instead of parsing the patterns.\n\
+Precompiled dictionaries can only be read on platforms with the same byte order\n\
+and struct layout.\n";
+
+static PyObject *
+Dict_save_binary(Dictobject *self, PyObject *args)
+{
+    const char *fn;
+    int failed;
+
+    if (!PyArg_ParseTuple(args, "s", &fn))
+        return NULL;
+    Py_BEGIN_ALLOW_THREADS
+    failed = hnj_hyphen_save_binary(self->dict, fn);
+    Py_END_ALLOW_THREADS
+    if (failed)
+    {
+        PyErr_SetFromErrnoWithFilename(PyExc_IOError, fn);
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+
+static  PyMethodDef Dict_methods[] = {
+	{"save_binary",	(PyCFunction)Dict_save_binary,
+    METH_VARARGS,	Dict_save_binary__doc__},
+	{NULL, NULL}		/* sentinel */
+};
+
+
+static void
+Dict_dealloc(Dictobject *self)
+{
+	if (self->dict) hnj_hyphen_free(self->dict);
+	    PyObject_Del(self);
+}
+
+static int
+Dict_init(Dictobject *self, PyObject *args, PyObject *kwds) {
+    static char *kwlist[] = {"path", "dense", "offset", "size", NULL};
+
+    /* Pointer to file-path of  dict */
+    
+    #if defined(_WIN32)
+    const wchar_t * fn;
+#else
+    const char * fn;
+ #endif
+ 
+    /* minimum number of transitions of states given a dense transition table */
+    int dense = DENSE_MIN_TRANS;
+    /* location of a precompiled dictionary within the file */
+    Py_ssize_t offset = 0, size = 0;
+
+    if (self->dict)
+    {
+        PyErr_SetString(PyExc_RuntimeError, "dictionary_ objects are immutable.");
+        return -1;
+    }
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "s|inn", kwlist, &fn, &dense, &offset, &size))
+	return -1;
+    if (offset < 0 || size < 0)
+    {
+        PyErr_SetString(PyExc_ValueError, "offset and size must not be negative.");
+        return -1;
+    }
+
+    /* Load a precompiled dictionary if the file is one, else parse the patterns.
+       Mapped dictionaries get no dense tables, which would be built on the heap
+       of each process loading them. */
+    Py_BEGIN_ALLOW_THREADS
+    if (offset || size)
+        self->dict = hnj_hyphen_load_binary_at((const char *) fn, (size_t) offset, (size_t) size);
+    else if (hnj_hyphen_is_binary((const char *) fn))
+        self->dict = hnj_hyphen_load_binary((const char *) fn);
+    else if ((self->dict = hnj_hyphen_load(fn)))
+        hnj_hyphen_build_dense(self->dict, dense);
+    Py_END_ALLOW_THREADS
+    if (!self->dict)
+    {
+          if (!PyErr_Occurred()) PyErr_SetString(PyExc_IOError, "Cannot load hyphen dictionary.");
+        return -1;
+    }
+    return 0;
+}
+
+
+static char Dict_type__doc__[] =
+"Immutable hyphenation dictionary shared by hyphenator_ objects.\n\n\
+Usage: dictionary_(dict_file_name: string[, dense[, offset, size]])\n\
+The init method will try to load a hyphenation dictionary with the filename passed.\n\
+The file may be a pattern file or a precompiled dictionary written by 'save_binary'.\n\
+States with at least 'dense' transitions get a dense transition table, e.g. 8.\n\
+The default of 0 disables them. Precompiled dictionaries never get them.\n\
+If 'offset' or 'size' is given, the precompiled dictionary stored in the 'size' bytes\n\
+at 'offset' of the file is mapped, e.g. an uncompressed zip member. 'offset' must be\n\
+a multiple of 8. A 'size' of 0 extends to the end of the file.\n\
+If an error occurs when trying to load the dictionary, IOError is raised.\n\
+Dictionary files compatible with hnjmodule can be downloaded at the LibreOffice website.\n"
+;
+
+
+static PyType_Slot Dict_type_slots[] = {
+    {Py_tp_doc, Dict_type__doc__},
+    {Py_tp_dealloc, (destructor)Dict_dealloc},
+    {Py_tp_methods, Dict_methods},
+    {Py_tp_init, (initproc)Dict_init},
+    {0, 0},
+};
+static PyType_Spec Dict_type_spec = {
+    "hnjmodule.dictionary_",
+    sizeof(Dictobject),
+    0,
+     Py_TPFLAGS_DEFAULT,
+    Dict_type_slots,
+};
+
 /* ---------- */
 /* ---------- */
 
@@ -360,6 +1506,31 @@ hnj_modexec(PyObject *m)
 	}
 	Py_INCREF(ErrorObject);
 	PyModule_AddObject(m, "error", ErrorObject);
+	if (TooLongObject == NULL) {
+		TooLongObject = PyErr_NewException("hnj.WordTooLongError", PyExc_ValueError, NULL);
+		if (TooLongObject == NULL)
+			goto fail;
+	}
+	Py_INCREF(TooLongObject);
+	PyModule_AddObject(m, "WordTooLongError", TooLongObject);
+
+    /* create the method names and the separator used for every word */
+    if (!separator_u && !(
+        (str_title = PyUnicode_InternFromString("title"))
+        && (str_upper = PyUnicode_InternFromString("upper"))
+        && (str_lower = PyUnicode_InternFromString("lower"))
+        && (separator_u = PyUnicode_InternFromString("="))))
+        goto fail;
+
+/* create Dict_type */
+if (!Dict_type && !(Dict_type = PyType_FromSpec(&Dict_type_spec))) {
+    goto fail;
+};
+    Py_INCREF(Dict_type);
+	if (PyModule_AddObject(m, "dictionary_", Dict_type) < 0) {
+        Py_DECREF(Dict_type);
+        goto fail;
+    }
 
 /* create HyDict_type */
 if (!(HyDict_type = PyType_FromSpec(&HyDict_type_spec))) {
@@ -379,6 +1550,10 @@ if (!(HyDict_type = PyType_FromSpec(&HyDict_type_spec))) {
 
 static PyModuleDef_Slot hnj_slots[] = {
     {Py_mod_exec, hnj_modexec},
+#ifdef Py_GIL_DISABLED
+    /* dictionary_ and hyphenator_ objects are immutable once initialized */
+    {Py_mod_gil, Py_MOD_GIL_NOT_USED},
+#endif
     {0, NULL}
 };
 
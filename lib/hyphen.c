@@ -61,6 +61,7 @@
 
 #include "hnjalloc.h"
 #include "hyphen.h"
+#include "hnjbinary.h"
 
 static char *
 hnj_strdup (const char *s)
@@ -200,6 +201,7 @@ hnj_get_state (HyphenDict *dict, HashTab *hashtab, const char *string)
   dict->states[dict->num_states].fallback_state = -1;
   dict->states[dict->num_states].num_trans = 0;
   dict->states[dict->num_states].trans = NULL;
+  dict->states[dict->num_states].dense = NULL;
   return dict->num_states++;
 }
 
@@ -412,6 +414,8 @@ for (k = 0; k < 2; k++) {
   dict[k]->states[0].fallback_state = -1;
   dict[k]->states[0].num_trans = 0;
   dict[k]->states[0].trans = NULL;
+  dict[k]->states[0].dense = NULL;
+  dict[k]->dense = NULL;
   dict[k]->nextlevel = NULL;
   dict[k]->lhmin = 0;
   dict[k]->rhmin = 0;
@@ -419,6 +423,8 @@ for (k = 0; k < 2; k++) {
   dict[k]->crhmin = 0;
   dict[k]->nohyphen = NULL;
   dict[k]->nohyphenl = 0;
+  dict[k]->mapping = NULL;
+  dict[k]->mapping_size = 0;
 
   /* read in character set info */
   if (k == 0) {
@@ -543,7 +549,8 @@ void hnj_hyphen_free (HyphenDict *dict)
   int state_num;
   HyphenState *hstate;
 
-  for (state_num = 0; state_num < dict->num_states; state_num++)
+  /* strings and transitions of precompiled dictionaries are mapped */
+  if (!dict->mapping) for (state_num = 0; state_num < dict->num_states; state_num++)
     {
       hstate = &dict->states[state_num];
       if (hstate->match)
@@ -555,13 +562,60 @@ void hnj_hyphen_free (HyphenDict *dict)
     }
   if (dict->nextlevel) hnj_hyphen_free(dict->nextlevel);
 
-  if (dict->nohyphen) hnj_free(dict->nohyphen);
+  if (dict->nohyphen && !dict->mapping) hnj_free(dict->nohyphen);
+
+  if (dict->dense) hnj_free(dict->dense);
 
   hnj_free (dict->states);
 
+  if (dict->mapping_size) hnj_hyphen_unmap (dict->mapping, dict->mapping_size);
+
   hnj_free (dict);
 }
 
+/* build dense transition rows (see hyphen.h) */
+void hnj_hyphen_build_dense (HyphenDict *dict, int min_trans)
+{
+  HyphenState *hstate;
+  int state_num, num_dense, c, k, t;
+  int *row;
+
+  for (; dict; dict = dict->nextlevel)
+    {
+      if (dict->dense) hnj_free (dict->dense);
+      dict->dense = NULL;
+      num_dense = 0;
+      for (state_num = 0; state_num < dict->num_states; state_num++)
+        {
+          hstate = &dict->states[state_num];
+          hstate->dense = NULL;
+          if (min_trans > 0 && hstate->num_trans >= min_trans) num_dense++;
+        }
+      if (!num_dense) continue;
+
+      row = dict->dense = (int *) hnj_malloc (num_dense * 256 * sizeof(int));
+      for (state_num = 0; state_num < dict->num_states; state_num++)
+        {
+          hstate = &dict->states[state_num];
+          if (hstate->num_trans < min_trans) continue;
+          for (c = 0; c < 256; c++)
+            {
+              /* follow the fallback chain as hnj_hyphen_hyph_ does */
+              row[c] = -1;
+              for (t = state_num; t != -1 && row[c] == -1; t = dict->states[t].fallback_state)
+                for (k = 0; k < dict->states[t].num_trans; k++)
+                  if (dict->states[t].trans[k].ch == (char) c)
+                    {
+                      row[c] = dict->states[t].trans[k].new_state;
+                      break;
+                    }
+            }
+          hstate->dense = row;
+          row += 256;
+        }
+    }
+}
+
 #define MAX_WORD 256
 
 int hnj_hyphen_hyphenate (HyphenDict *dict,
@@ -624,6 +678,17 @@ int hnj_hyphen_hyphenate (HyphenDict *dict,
 #endif
 
 	  hstate = &dict->states[state];
+	  /* dense rows map each byte to the next state in O(1), */
+	  /* with the fallback chain already resolved */
+	  if (hstate->dense)
+	    {
+	      state = hstate->dense[(unsigned char) ch];
+	      if (state == -1) {
+	        state = 0;
+	        goto try_next_letter;
+	      }
+	      goto found_state;
+	    }
 	  for (k = 0; k < hstate->num_trans; k++)
 	    if (hstate->trans[k].ch == ch)
 	      {
@@ -856,6 +921,17 @@ int hnj_hyphen_hyph_(HyphenDict *dict, const char *word, int word_size,
 #endif
 
 	  hstate = &dict->states[state];
+	  /* dense rows map each byte to the next state in O(1), */
+	  /* with the fallback chain already resolved */
+	  if (hstate->dense)
+	    {
+	      state = hstate->dense[(unsigned char) ch];
+	      if (state == -1) {
+	        state = 0;
+	        goto try_next_letter;
+	      }
+	      goto found_state;
+	    }
 	  for (k = 0; k < hstate->num_trans; k++)
 	    if (hstate->trans[k].ch == ch)
 	      {
@@ -78,6 +78,12 @@ struct _HyphenDict {
   int utf8;
   HyphenState *states;
   HyphenDict *nextlevel;
+  /* precompiled dictionaries: the mapping of the file holding the transitions
+     and strings, and its size in the level owning the mapping (else 0) */
+  char *mapping;
+  size_t mapping_size;
+  /* storage of the dense transition rows of the states, or NULL */
+  int *dense;
 };
 
 struct _HyphenState {
@@ -88,6 +94,7 @@ struct _HyphenState {
   int fallback_state;
   int num_trans;
   HyphenTrans *trans;
+  int *dense;   /* NULL, or next state for each byte with fallbacks resolved */
 };
 
 struct _HyphenTrans {
@@ -106,6 +113,14 @@ struct _HyphenTrans {
 HyphenDict *hnj_hyphen_load_file (FILE *f);
 void hnj_hyphen_free (HyphenDict *dict);
 
+/* Give each state of 'dict' and its next levels with at least 'min_trans'
+   transitions a dense table of 256 next states, one for each byte, with
+   the fallback chain already resolved (-1: no state matches). This makes
+   transitions from frequently visited states O(1) at a cost of 1 KB per
+   state. States with fewer transitions keep the linear scan of 'trans'.
+   min_trans <= 0 removes all dense tables. */
+void hnj_hyphen_build_dense (HyphenDict *dict, int min_trans);
+
 /* obsolete, use hnj_hyphen_hyphenate2() or *hyphenate3() functions) */
 int hnj_hyphen_hyphenate (HyphenDict *dict,
 			   const char *word, int word_size,
@@ -3,11 +3,15 @@
 
 import io
 import os
+import sysconfig
 from setuptools import setup, Extension, find_packages
 
 
 HERE = os.path.abspath(os.path.dirname(__file__))
 
+# Free-threaded builds of CPython do not support the limited API.
+LIMITED_API = not sysconfig.get_config_var('Py_GIL_DISABLED')
+
 
 def load_requirements():
     with io.open(
@@ -45,9 +49,11 @@ setup(
     ext_modules=[
         Extension('hyphen.hnj', ['lib/hnjmodule.c',
                                  'lib/hyphen.c',
-                                 'lib/hnjalloc.c'],
+                                 'lib/hnjalloc.c',
+                                 'lib/hnjbinary.c'],
                   include_dirs=['lib'],
-                  py_limited_api=True)
+                  define_macros=[('Py_LIMITED_API', '0x03070000')] if LIMITED_API else [],
+                  py_limited_api=LIMITED_API)
                   ],
     install_requires=load_requirements(),
     include_package_data=True,
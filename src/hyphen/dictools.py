@@ -4,20 +4,46 @@
 This module contains convenience functions to manage hyphenation dictionaries.
 '''
 
+import contextlib
+import errno
+import functools
 import json
 import os
-import appdirs
-import  requests 
+import threading
+import time
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
 
+# requests, appdirs and the modules needed for packs or XML are imported
+# where they are used. Most processes only load installed dictionaries.
 
-__all__ = ['install', 'is_installed', 'uninstall', 'list_installed']
+from . import hnj
+from .metrics import Metrics
 
-# default location to store hyphenation dictionaries
-DEFAULT_DICT_PATH = appdirs.user_data_dir("pyhyphen", appauthor=False)
+
+__all__ = ['install', 'install_many', 'is_installed', 'uninstall', 'list_installed',
+    'precompile', 'load', 'list_loaded', 'evict', 'RepositoryIndex',
+    'build_pack', 'list_pack', 'load_pack', 'dictionary_metrics', 'dictionary_stats']
+
+# default location to store hyphenation dictionaries:
+# DEFAULT_DICT_PATH is set by _default_dict_path when first used.
 
 # Where PyHyphen tries to retrieve dictionaries for download
 DEFAULT_REPOSITORY = 'https://raw.githubusercontent.com/LibreOffice/dictionaries/master/'
 
+# Number of seconds for which entries of the repository index are used
+# without asking the repository whether they changed
+INDEX_MAX_AGE = 24 * 3600
+
+# File extension of precompiled dictionaries
+COMPILED_EXTENSION = '.hnjb'
+
+# Name of the index of a dictionary pack, see `build_pack`
+PACK_INDEX = 'index.json'
+
 # List of languages for which there are dictionaries in the
 # default repository.
 LANGUAGES = [
@@ -84,15 +110,139 @@ LANGUAGES = [
 ]
 
 
+def _default_dict_path():
+    '''
+    Return DEFAULT_DICT_PATH, the user data directory, determining it on first use.
+    '''
+    path = globals().get('DEFAULT_DICT_PATH')
+    if path is None:
+        import appdirs
+        path = appdirs.user_data_dir("pyhyphen", appauthor=False)
+        path = globals().setdefault('DEFAULT_DICT_PATH', path)
+    return path
+
+
+def __getattr__(name):
+    if name == 'DEFAULT_DICT_PATH':
+        return _default_dict_path()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+@contextlib.contextmanager
+def _replacing(path):
+    '''
+    Return a context manager yielding the path of a temporary file in the
+    directory of `path`. The temporary file replaces `path` at once when the
+    block is left without error, so that other processes see either the old
+    or the new file, but never a partially written one.
+    '''
+    temp_path = f'{path}.{os.urandom(8).hex()}.tmp'
+    try:
+        yield temp_path
+        os.replace(temp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temp_path)
+        raise
+
+
+class _FileLock:
+    '''
+    Exclusive lock shared by threads and processes using the lock file `path`.
+    Acquiring the lock blocks until it is released by its current holder.
+    The lock file is created if needed and never removed.
+    '''
+
+    # Delays in seconds between attempts to lock a file held by another process
+    # on Windows. They double up to the maximum.
+    _MIN_DELAY = 0.01
+    _MAX_DELAY = 1.0
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def acquire(self):
+        f = open(self.path, 'a+b')
+        try:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                delay = self._MIN_DELAY
+                while True:
+                    try:
+                        msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                        break
+                    except OSError as e:
+                        # Only these mean that another process holds the lock
+                        if e.errno not in (errno.EACCES, errno.EDEADLOCK):
+                            raise
+                    time.sleep(delay)
+                    delay = min(2 * delay, self._MAX_DELAY)
+        except BaseException:
+            f.close()
+            raise
+        self._file = f
+
+    def release(self):
+        f, self._file = self._file, None
+        if not fcntl:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        # Closing the file releases the lock
+        f.close()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+# Contents of the dictionaries.json files read by this process, keyed by path.
+# Each is stored with the stat result of the file it was read from.
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def _read_registry(path):
+    '''
+    Return a copy of the contents of the dictionaries.json file `path`,
+    or {} if it does not exist. The file is read only if it changed
+    since it was last read or written by this process.
+    '''
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return {}
+    key = (st.st_mtime_ns, st.st_size, st.st_ino)
+    with _registries_lock:
+        cached = _registries.get(path)
+    if cached is None or cached[0] != key:
+        with open(path, 'rb') as f:
+            cached = (key, json.load(f))
+        with _registries_lock:
+            _registries[path] = cached
+    return dict(cached[1])
+
+
+def _remember_registry(path, data):
+    '''
+    Record that `data` was written to the dictionaries.json file `path`.
+    '''
+    st = os.stat(path)
+    with _registries_lock:
+        _registries[path] = ((st.st_mtime_ns, st.st_size, st.st_ino), dict(data))
+
+
 class Dictionaries:
 
     def __init__(self, directory=None):
-        self.directory = directory or DEFAULT_DICT_PATH
+        self.directory = directory or _default_dict_path()
         self._data = None
 
-        if not os.path.exists(self.directory):
-            os.makedirs(self.directory)
-
     @property
     def path(self):
         return os.path.join(self.directory, 'dictionaries.json')
@@ -100,11 +250,7 @@ class Dictionaries:
     @property
     def data(self):
         if self._data is None:
-            if os.path.exists(self.path):
-                with open(self.path, 'rb') as f:
-                    self._data = json.load(f)
-            else:
-                self._data = {}
+            self._data = _read_registry(self.path)
         return self._data
 
     def installed_languages(self):
@@ -116,6 +262,14 @@ class Dictionaries:
     def filepath(self, language):
         return os.path.join(self.directory, self.data[language]["file"])
 
+    def lock(self, name='dictionaries'):
+        '''
+        Return an inter-process lock named `name` for the directory,
+        creating the directory if needed. See `install` for its use.
+        '''
+        os.makedirs(self.directory, exist_ok=True)
+        return _FileLock(os.path.join(self.directory, '.' + name + '.lock'))
+
     def add(self, language, content, locales, url):
         """
         Return the path to which the file was saved.
@@ -123,16 +277,19 @@ class Dictionaries:
         # Save to file
         filename = 'hyph_' + language + ".dic"
         filepath = os.path.join(self.directory, filename)
-        with open(filepath, 'wb') as f:
-            f.write(content)
+        os.makedirs(self.directory, exist_ok=True)
+        with _replacing(filepath) as temp_path:
+            with open(temp_path, 'wb') as f:
+                f.write(content)
 
         # Add file to configuration
-        for locale in locales:
-            self.data[locale] = {
-                "file": filename,
-                "url": url
-            }
-        self.save()
+        def add_locales(data):
+            for locale in locales:
+                data[locale] = {
+                    "file": filename,
+                    "url": url
+                }
+        self._update(add_locales)
 
         return filepath
 
@@ -140,27 +297,46 @@ class Dictionaries:
         """
         Remove language and all languages that share the same file.
         """
-        if language not in self.data:
-            return
+        filenames = []
 
         # Remove languages from file
-        filename = self.data[language]["file"]
-        languages = [language for language,
-                     props in self.data.items() if props["file"] == filename]
-        for locale in languages:
-            self.data.pop(locale)
-        self.save()
-
-        # Remove file
-        filepath = os.path.join(self.directory, filename)
-        if os.path.exists(filepath):
-            os.remove(filepath)
+        def remove_locales(data):
+            if language in data:
+                filenames.append(data[language]["file"])
+                for locale in [locale for locale, props in data.items()
+                               if props["file"] == filenames[0]]:
+                    data.pop(locale)
+        self._update(remove_locales)
+
+        # Remove file and the precompiled dictionary, if any
+        for filename in filenames:
+            filepath = os.path.join(self.directory, filename)
+            for path in (filepath, compiled_path(filepath)):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def _update(self, change):
+        '''
+        Apply the function `change` to the current contents of dictionaries.json
+        and save them. Other processes cannot modify the file meanwhile.
+        '''
+        with self.lock():
+            data = _read_registry(self.path)
+            change(data)
+            self._write(data)
+            self._data = data
 
     def save(self):
         # Access data to make sure it's properly loaded
         data = self.data
-        with open(self.path, "wt") as f:
-            json.dump(data, f, indent=2, sort_keys=True)
+        with self.lock():
+            self._write(data)
+
+    def _write(self, data):
+        with _replacing(self.path) as temp_path:
+            with open(temp_path, "wt") as f:
+                json.dump(data, f, indent=2, sort_keys=True)
+        _remember_registry(self.path, data)
 
     def reload(self):
         self._data = None
@@ -193,8 +369,343 @@ def uninstall(language, directory=None):
     Dictionaries(directory).remove(language)
 
 
+def compiled_path(filepath):
+    '''
+    Return the path of the precompiled dictionary for the dictionary file `filepath`.
+    '''
+    return os.path.splitext(filepath)[0] + COMPILED_EXTENSION
+
+
+def loadable_path(filepath):
+    '''
+    Return the path of the precompiled dictionary for `filepath` if it exists
+    and is not older than `filepath`. Otherwise return `filepath`.
+    '''
+    compiled = compiled_path(filepath)
+    try:
+        if os.path.getmtime(compiled) >= os.path.getmtime(filepath):
+            return compiled
+    except OSError:
+        pass
+    return filepath
+
+
+def compile_file(filepath):
+    '''
+    Write a precompiled dictionary next to the dictionary file `filepath`
+    and return its path.
+
+    Precompiled dictionaries are mapped into memory rather than parsed when a
+    Hyphenator is created. So startup is almost instant, and processes using
+    the same dictionary share its memory.
+    '''
+    target = compiled_path(filepath)
+    with _replacing(target) as temp_path:
+        hnj.dictionary_(filepath).save_binary(temp_path)
+    return target
+
+
+def precompile(language, directory=None):
+    '''
+    Write a precompiled dictionary for an installed language and return its path.
+    See `compile_file` for details.
+    '''
+    return compile_file(Dictionaries(directory).filepath(language))
+
+
+# Dictionaries loaded by the C extension, keyed by the resolved path
+# and the modification time of the loaded file
+_loaded = {}
+# Metrics of the loaded dictionaries, with the same keys
+_metrics = {}
+_loaded_lock = threading.Lock()
+
+
+def _load_locked(key, load, *args):
+    '''
+    Return the dictionary stored under `key`. If there is none, store
+    the dictionary returned by load(*args) along with its metrics.
+    Must be called holding _loaded_lock.
+    '''
+    dictionary = _loaded.get(key)
+    if dictionary is None:
+        start = time.perf_counter_ns()
+        dictionary = load(*args)
+        metrics = Metrics()
+        metrics.add('load_ns', time.perf_counter_ns() - start)
+        # Forget outdated versions of the file
+        for stale in [k for k in _loaded if k[0] == key[0]]:
+            del _loaded[stale]
+            del _metrics[stale]
+        _loaded[key] = dictionary
+        _metrics[key] = metrics
+    return dictionary
+
+
+def load(filepath):
+    '''
+    Return the loaded dictionary (a `hnj.dictionary_` object) for the
+    dictionary file `filepath`, preferring an up-to-date precompiled dictionary.
+
+    Loaded dictionaries are immutable and shared by all hyphenators of the
+    process. A dictionary is loaded again only if its file was modified.
+    '''
+    path = os.path.realpath(loadable_path(filepath))
+    key = (path, os.stat(path).st_mtime_ns)
+    with _loaded_lock:
+        return _load_locked(key, hnj.dictionary_, path)
+
+
+def dictionary_metrics(dictionary):
+    '''
+    Return the `Metrics` of a dictionary returned by `load` or `load_pack`,
+    or None if it is not loaded anymore.
+    '''
+    with _loaded_lock:
+        for key, loaded in _loaded.items():
+            if loaded is dictionary:
+                return _metrics[key]
+
+
+def dictionary_stats():
+    '''
+    Return a dict mapping the paths of the loaded dictionaries to a snapshot
+    of their metrics. These include the time taken to load the dictionary
+    and the counts of all hyphenators using it that were created with
+    `metrics` enabled. See `hyphen.metrics.Metrics` for the counters.
+    '''
+    with _loaded_lock:
+        items = list(_metrics.items())
+    return {path: metrics.snapshot() for (path, _mtime), metrics in items}
+
+
+def list_loaded():
+    '''
+    Return a sorted list of the paths of the dictionaries loaded by `load`.
+    '''
+    with _loaded_lock:
+        return sorted(path for path, _mtime in _loaded)
+
+
+def evict(filepath=None):
+    '''
+    Forget the loaded dictionary for `filepath`, or all loaded dictionaries
+    if `filepath` is None. Hyphenators using a dictionary keep it alive.
+    The memory is released when the last of them is deleted.
+    '''
+    paths = None
+    if filepath is not None:
+        paths = {os.path.realpath(filepath),
+            os.path.realpath(loadable_path(filepath))}
+    with _loaded_lock:
+        for key in list(_loaded):
+            if paths is None or key[0] in paths:
+                del _loaded[key]
+                del _metrics[key]
+
+
+def build_pack(path, languages=None, directory=None, precompiled=True):
+    '''
+    Write a pack file holding the installed dictionaries for `languages`
+    to `path` and return `path`. Hyphenators can then be created from the pack
+    on hosts without network access, see `load_pack`.
+
+    languages: an iterable of installed languages. (Default: all installed languages)
+    directory (str): the installation directory. (Default: user data directory)
+    precompiled (bool): if True, also store a precompiled dictionary for each
+        dictionary file. It is mapped into memory straight from the pack.
+        Precompiled dictionaries are specific to the platform writing the pack.
+        On other platforms, the dictionary file is loaded instead.
+
+    A pack is a zip file. Dictionary files are compressed, precompiled
+    dictionaries are stored uncompressed. The member 'index.json' maps
+    each language to the name of its dictionary file.
+    '''
+    import zipfile
+
+    dictionaries = Dictionaries(directory)
+    if languages is None:
+        languages = dictionaries.installed_languages()
+    index = {language: dictionaries.data[language]['file'] for language in languages}
+    with _replacing(path) as temp_path, \
+            zipfile.ZipFile(temp_path, 'w', zipfile.ZIP_DEFLATED) as pack:
+        pack.writestr(PACK_INDEX, json.dumps(index, indent=2, sort_keys=True))
+        for filename in sorted(set(index.values())):
+            filepath = os.path.join(dictionaries.directory, filename)
+            pack.write(filepath, filename)
+            if precompiled:
+                compiled = compiled_path(temp_path)
+                try:
+                    hnj.dictionary_(filepath).save_binary(compiled)
+                    with open(compiled, 'rb') as f:
+                        _write_aligned(pack, compiled_path(filename), f.read())
+                finally:
+                    os.remove(compiled)
+    return path
+
+
+def _write_aligned(pack, name, data, alignment=8):
+    '''
+    Store `data` uncompressed as member `name` of the zip file `pack`
+    at an offset that is a multiple of `alignment`, as required for mapping it.
+    '''
+    import struct
+    import zipfile
+
+    info = zipfile.ZipInfo(name, time.localtime()[:6])
+    info.compress_type = zipfile.ZIP_STORED
+    info.file_size = info.compress_size = len(data)
+    info.CRC = 0
+    # The member is written at the end of the members written so far. Its
+    # local header is padded using an extra block of id 0xd935 as zipalign
+    # does. Large members get a zip64 extra block as in ZipFile.writestr.
+    info.extra = struct.pack('<HH', 0xd935, 0)
+    zip64 = info.file_size * 1.05 > zipfile.ZIP64_LIMIT
+    offset = pack.start_dir + len(info.FileHeader(zip64))
+    padding = -offset % alignment
+    info.extra = struct.pack('<HH', 0xd935, padding) + bytes(padding)
+    pack.writestr(info, data)
+
+
+# Indexes of the packs read by this process, keyed by the resolved path
+_packs = {}
+
+
+def _read_pack(pack):
+    '''
+    Return (path, mtime, index, members) for the pack file `pack`.
+    `members` maps the names of its uncompressed members to their (offset, size).
+    '''
+    path = os.path.realpath(pack)
+    mtime = os.stat(path).st_mtime_ns
+    cached = _packs.get(path)
+    if cached is None or cached[1] != mtime:
+        import struct
+        import zipfile
+
+        with zipfile.ZipFile(path) as z, open(path, 'rb') as f:
+            index = json.loads(z.read(PACK_INDEX))
+            members = {}
+            for info in z.infolist():
+                if info.compress_type == zipfile.ZIP_STORED:
+                    f.seek(info.header_offset + 26)
+                    name_size, extra_size = struct.unpack('<HH', f.read(4))
+                    offset = info.header_offset + 30 + name_size + extra_size
+                    members[info.filename] = (offset, info.file_size)
+        cached = _packs[path] = (path, mtime, index, members)
+    return cached
+
+
+def list_pack(pack):
+    '''
+    Return a sorted list of the languages for which the pack file `pack`
+    holds dictionaries.
+    '''
+    return sorted(_read_pack(pack)[2])
+
+
+def load_pack(pack, language):
+    '''
+    Return the loaded dictionary for `language` from the pack file `pack`
+    written by `build_pack`. Only this dictionary is read: a precompiled
+    dictionary is mapped into memory straight from the pack, otherwise
+    the dictionary file is decompressed and parsed. Nothing is extracted.
+
+    Loaded dictionaries are shared as by `load`.
+    Raise an IOError if the pack holds no dictionary for `language`.
+    '''
+    path, mtime, index, members = _read_pack(pack)
+    if language not in index:
+        raise IOError(f'No dictionary for language {language} in {pack}.')
+    filename = index[language]
+    key = (os.path.join(path, filename), mtime)
+    with _loaded_lock:
+        return _load_locked(key, _load_from_pack, path, filename, members)
+
+
+def _load_from_pack(path, filename, members):
+    compiled = compiled_path(filename)
+    if compiled in members:
+        offset, size = members[compiled]
+        try:
+            return hnj.dictionary_(path, offset=offset, size=size)
+        except IOError:
+            # The pack was written on another platform.
+            pass
+    return _load_member(path, filename)
+
+
+def _load_member(path, filename):
+    '''
+    Return a dictionary loaded from the dictionary file `filename` in the pack `path`.
+    '''
+    import tempfile
+    import zipfile
+
+    with zipfile.ZipFile(path) as z:
+        content = z.read(filename)
+    fd, temp_path = tempfile.mkstemp(suffix='.dic')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        return hnj.dictionary_(temp_path)
+    finally:
+        os.remove(temp_path)
+
+
+# HTTP session shared by all downloads of `install`, reusing connections
+_session = None
+_session_lock = threading.Lock()
+
+
+def _get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests
+            _session = requests.Session()
+        return _session
+
+
+def _new_session(pool_size):
+    '''
+    Return a session keeping up to `pool_size` connections per host.
+    '''
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def _after_fork_in_child():
+    '''
+    Reset what a forked process must not share with its parent: the locks,
+    which another thread of the parent may have held when it forked, and the
+    connections of the HTTP session. Loaded dictionaries are kept, so the
+    child uses them without loading them again.
+    '''
+    global _registries_lock, _loaded_lock, _session_lock, _session
+    _registries_lock = threading.Lock()
+    _loaded_lock = threading.Lock()
+    _session_lock = threading.Lock()
+    _session = None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def _guess_dictionary_url(repos, language):
+    # handle the case that there is no xml metadata: we just guess its url
+    return '/'.join((repos, language, 'hyph_' + language + '.dic')), [language]
+
+
 def install(language, directory=None, repos=None, use_description=True, overwrite=False, 
-    **request_args):
+    precompile=False, **request_args):
     '''
     Download  and install a dictionary file.
 
@@ -203,66 +714,209 @@ def install(language, directory=None, repos=None, use_description=True, overwrit
     repos (str): the url of the dictionary repository. (Default: the
         libreoffice dictionary repo)
     use_description (bool): if True, parse dictionaries.xcu file to
-        automatically find the appropriate dictionary.
+        automatically find the appropriate dictionary. The parsed files are
+        cached in a `RepositoryIndex` in `directory`.
     overwrite (bool): if True, overwrite any existing dictionary. Default: False
+    precompile (bool): if True, also write a precompiled dictionary if there
+        is no up-to-date one. Default: False
     **request_args: additional kwargs to be passed to `requests.get()` for HTTP configuration
 
+    Downloads share a single HTTP session, so connections to the repository are reused.
+    To install many dictionaries at once, see `install_many`.
+
     Return the path to the file that was downloaded or is already installed.
     '''
+    dictionaries = Dictionaries(directory)
     if not overwrite:
-        dictionaries = Dictionaries(directory)
-        if dictionaries.is_installed(language):
-            return dictionaries.filepath(language)
+        filepath = _installed_path(dictionaries, language, precompile)
+        if filepath:
+            return filepath
 
     if not repos:
         repos = DEFAULT_REPOSITORY
 
-    dict_url = None
-    if use_description:
-        # Find the dictionary location from the dictionaries.xcu description
-        dict_url, locales = find_dictionary_location(repos, language, **request_args)
-    if not dict_url:
-        # handle the case that there is no xml metadata: we just guess its url
-        dict_url = '/'.join((repos, language, 'hyph_' + language + '.dic'))
-        locales = [language]
+    # Processes installing the same language wait for each other.
+    with dictionaries.lock('install-' + language):
+        if not overwrite:
+            # Installed by another process while we waited?
+            dictionaries.reload()
+            filepath = _installed_path(dictionaries, language, precompile)
+            if filepath:
+                return filepath
 
-    # Install the dictionary file
-    response = requests.get(dict_url, **request_args)
-    response.raise_for_status()
-    dict_content = response.content
-    return Dictionaries(directory).add(language, dict_content, locales, dict_url)
+        dict_url = None
+        if use_description:
+            # Find the dictionary location from the dictionaries.xcu description
+            dict_url, locales = RepositoryIndex(directory).locate(repos, language, **request_args)
+        if not dict_url:
+            dict_url, locales = _guess_dictionary_url(repos, language)
 
+        # Install the dictionary file
+        response = _get_session().get(dict_url, **request_args)
+        response.raise_for_status()
+        dict_content = response.content
+        filepath = dictionaries.add(language, dict_content, locales, dict_url)
+        if precompile:
+            compile_file(filepath)
+    return filepath
 
-def find_dictionary_location(repos, language, **request_args):
+
+def _installed_path(dictionaries, language, precompile):
     '''
-    Find the location of a language dictionary from an xcu file from the LibreOffice repo.
-    Any kwargs will be passed to `requests.get()` to configure the HTTP connection.
-    Raise an IOError if the dictionary location could not be found in the xcu file.
+    Return the path of the installed dictionary for `language`, precompiling it
+    if `precompile` is true and there is no up-to-date precompiled dictionary.
+    Return None if `language` is not installed.
+    '''
+    if dictionaries.is_installed(language):
+        filepath = dictionaries.filepath(language)
+        if precompile and loadable_path(filepath) == filepath:
+            compile_file(filepath)
+        return filepath
+
+
+async def install_many(languages, directory=None, repos=None, use_description=True,
+    overwrite=False, precompile=False, concurrency=8, **request_args):
+    '''
+    Download and install the dictionaries for an iterable of languages concurrently.
+
+    Description files and dictionaries are downloaded by up to `concurrency`
+    threads sharing a pool of HTTP connections. Each description file and
+    dictionary is downloaded only once, e.g. for 'de_AT' and 'de_DE'.
+    For each language, the descriptions for 'll_CC' and 'll' are requested at
+    the same time rather than one after the other. Description files are
+    cached in the `RepositoryIndex` of `directory` as by `install`.
+    The other arguments are as for `install`.
+
+    Return a dict mapping each language to the path of its dictionary file.
+    Raise the first error occurring. Dictionaries installed until then are kept.
+
+    Example: paths = asyncio.run(install_many(['de_DE', 'fr_FR', 'nl_NL']))
+    '''
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+
+    languages = list(dict.fromkeys(languages))
+    if not repos:
+        repos = DEFAULT_REPOSITORY
+    dictionaries = Dictionaries(directory)
+    index = RepositoryIndex(directory)
+    loop = asyncio.get_running_loop()
+    # Tasks keyed by url, so that each url is requested once
+    downloads = {}
+    descriptions = {}
+
+    with ThreadPoolExecutor(concurrency) as executor, \
+            _new_session(concurrency) as session:
+
+        async def run(func, *args, **kwargs):
+            return await loop.run_in_executor(executor,
+                functools.partial(func, *args, **kwargs))
+
+        def get(url):
+            if url not in downloads:
+                downloads[url] = asyncio.ensure_future(
+                    run(session.get, url, **request_args))
+            return downloads[url]
+
+        def describe(origin_url):
+            if origin_url not in descriptions:
+                descriptions[origin_url] = asyncio.ensure_future(run(
+                    index._describe, origin_url, session.get, request_args))
+            return descriptions[origin_url]
+
+        async def locate(language):
+            return _select_dictionary(await asyncio.gather(
+                *map(describe, _origins(repos, language))), language)
+
+        async def install_one(language):
+            if not overwrite:
+                filepath = await run(_installed_path, dictionaries, language, precompile)
+                if filepath:
+                    return filepath
+
+            lock = dictionaries.lock('install-' + language)
+            await run(lock.acquire)
+            try:
+                return await install_locked(language)
+            finally:
+                lock.release()
+
+        async def install_locked(language):
+            if not overwrite:
+                dictionaries.reload()
+                filepath = await run(_installed_path, dictionaries, language, precompile)
+                if filepath:
+                    return filepath
+
+            dict_url = None
+            if use_description:
+                dict_url, locales = await locate(language)
+            if not dict_url:
+                dict_url, locales = _guess_dictionary_url(repos, language)
+            response = await get(dict_url)
+            response.raise_for_status()
+            filepath = await run(dictionaries.add, language, response.content, locales, dict_url)
+            if precompile:
+                await run(compile_file, filepath)
+            return filepath
+
+        tasks = [asyncio.ensure_future(install_one(language)) for language in languages]
+        try:
+            paths = await asyncio.gather(*tasks)
+        finally:
+            for task in [*downloads.values(), *descriptions.values(), *tasks]:
+                task.cancel()
+    return dict(zip(languages, paths))
+
+
+def _origins(repos, language):
+    '''
+    Return the urls of the repository folders that may describe the
+    dictionary for `language`, in order of preference.
     '''
-    # Download the dictionaries.xcu file from the LibreOffice repository if needed
-    # This is an XML file that lists all the available dictionaries for that language.
     # First, try full language name; it won't work in all cases...
-    origin_url = repos + language
-    descr_file = _download_dictionaries_xcu(origin_url, **request_args)
-    if descr_file is None and len(language) > 2:
+    origins = [repos + language]
+    if len(language) > 2:
         # OK. So try with the country code.
-        origin_url = repos + language[:2]
-        descr_file = _download_dictionaries_xcu(origin_url, **request_args)
-
-    if not descr_file:
-        return None, []
+        origins.append(repos + language[:2])
+    return origins
 
-    # Parse the xml file if it is present, and extract the data.
-    dict_url, locales = parse_dictionary_location(
-        descr_file, origin_url, language)
 
-    if not dict_url:
+def _select_dictionary(descriptions, language):
+    '''
+    Return (url, locales) of the dictionary for `language` from the first
+    description which is not None, or (None, []) if all are None.
+    `descriptions` is an iterable of lists as returned by `parse_dictionary_index`.
+    '''
+    for description in descriptions:
+        if description is None:
+            continue
+        for dict_url, locales in description:
+            if language in locales or any(locale.startswith(language + '_') for locale in locales):
+                return dict_url, locales
         # Catch the case that there is no hyphenation dict
         # for this language:
         raise IOError(
             'Cannot find hyphenation dictionary for language ' + language + '.')
+    return None, []
+
+
+def find_dictionary_location(repos, language, **request_args):
+    '''
+    Find the location of a language dictionary from an xcu file from the LibreOffice repo.
+    Any kwargs will be passed to `requests.get()` to configure the HTTP connection.
+    Raise an IOError if the dictionary location could not be found in the xcu file.
 
-    return dict_url, locales
+    The xcu files are downloaded each time. `RepositoryIndex.locate` caches them.
+    '''
+    # Download the dictionaries.xcu file from the LibreOffice repository if needed
+    # This is an XML file that lists all the available dictionaries for that language.
+    def descriptions():
+        for origin_url in _origins(repos, language):
+            descr_file = _download_dictionaries_xcu(origin_url, **request_args)
+            yield descr_file and parse_dictionary_index(descr_file, origin_url)
+
+    return _select_dictionary(descriptions(), language)
 
 
 def parse_dictionary_location(descr_file, origin_url, language):
@@ -278,10 +932,22 @@ def parse_dictionary_location(descr_file, origin_url, language):
         url (unicode)
         locales (unicode list)
     '''
+    try:
+        return _select_dictionary([parse_dictionary_index(descr_file, origin_url)], language)
+    except IOError:
+        return None, []
+
+
+def parse_dictionary_index(descr_file, origin_url):
+    '''
+    Parse the dictionaries.xcu file and return a list of [url, locales]
+    for all hyphenation dictionaries it describes.
+    '''
     from xml.etree import ElementTree 
 
     descr_tree = ElementTree.fromstring(descr_file)
 
+    dictionaries = []
     # Find the nodes containing meta data of hyphenation dictionaries
     # Iterate over all nodes
     for node in descr_tree.iter('node'):
@@ -310,12 +976,11 @@ def parse_dictionary_location(descr_file, origin_url, language):
                     locales = prop[0].text.replace(
                         '-', '_').split()
                     # break # skip any other values of this property
-        if (language in locales or any(locale.startswith(language + '_') for locale in locales)) and dict_location:
+        if dict_location:
             # strip the prefix '%origin%'
-            dict_url = origin_url + '/' + dict_location[9:]
-            return dict_url, locales
+            dictionaries.append([origin_url + '/' + dict_location[9:], locales])
 
-    return None, []
+    return dictionaries
 
 
 def _download_dictionaries_xcu(origin_url, **request_args):
@@ -324,9 +989,114 @@ def _download_dictionaries_xcu(origin_url, **request_args):
     Any **request_args are passed to `requests.get()` to configure the HTTP connection.
     '''
     url = origin_url + '/dictionaries.xcu'
-    response = requests.get(url, **request_args)
+    response = _get_session().get(url, **request_args)
     # Return the content if received.
     # In case of an HTTP error, return the response.
     # HTTP errors are silently dropped. Fix this?
     if response.status_code == 200:
         return response.content 
+
+
+class RepositoryIndex:
+    '''
+    On-disk cache of the dictionaries.xcu files of dictionary repositories.
+
+    For each repository folder, the index stores the urls and locales of the
+    hyphenation dictionaries described by its dictionaries.xcu file, or that
+    there is no such file. Locating a dictionary in a folder seen before
+    takes no download and no XML parsing.
+
+    Entries older than `max_age` seconds are revalidated by a conditional
+    request using the ETag and Last-Modified headers of the last download.
+    If None, entries never expire. If the repository cannot be reached,
+    outdated entries are used, so locating dictionaries works offline.
+    '''
+
+    def __init__(self, directory=None, max_age=INDEX_MAX_AGE):
+        self.directory = directory or _default_dict_path()
+        self.max_age = max_age
+        self._data = None
+        self._lock = threading.Lock()
+
+    @property
+    def path(self):
+        return os.path.join(self.directory, 'repository_index.json')
+
+    @property
+    def data(self):
+        if self._data is None:
+            if os.path.exists(self.path):
+                with open(self.path, 'rb') as f:
+                    self._data = json.load(f)
+            else:
+                self._data = {}
+        return self._data
+
+    def save(self):
+        data = self.data
+        os.makedirs(self.directory, exist_ok=True)
+        with _replacing(self.path) as temp_path:
+            with open(temp_path, "wt") as f:
+                json.dump(data, f, indent=2, sort_keys=True)
+
+    def reload(self):
+        self._data = None
+
+    def describe(self, origin_url, **request_args):
+        '''
+        Return a list of [url, locales] for the hyphenation dictionaries in the
+        repository folder `origin_url`, or None if it has no dictionaries.xcu file.
+        Any kwargs will be passed to `requests.get()` to configure the HTTP connection.
+        '''
+        return self._describe(origin_url, _get_session().get, request_args)
+
+    def _describe(self, origin_url, get, request_args):
+        import requests
+
+        url = origin_url + '/dictionaries.xcu'
+        with self._lock:
+            entry = self.data.get(url)
+        now = time.time()
+        if entry and (self.max_age is None or now - entry['checked'] < self.max_age):
+            return entry['dictionaries']
+
+        request_args = dict(request_args)
+        headers = dict(request_args.pop('headers', None) or {})
+        if entry and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        try:
+            response = get(url, headers=headers, **request_args)
+        except requests.RequestException:
+            if entry:
+                return entry['dictionaries']
+            raise
+
+        if response.status_code == 304 and entry:
+            entry = dict(entry, checked=now)
+        elif response.status_code == 200:
+            entry = {
+                'checked': now,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'dictionaries': parse_dictionary_index(response.content, origin_url),
+            }
+        elif response.status_code == 404:
+            entry = {'checked': now, 'dictionaries': None}
+        else:
+            # Other HTTP errors are silently dropped as by find_dictionary_location.
+            return entry['dictionaries'] if entry else None
+        with self._lock:
+            self.data[url] = entry
+            self.save()
+        return entry['dictionaries']
+
+    def locate(self, repos, language, **request_args):
+        '''
+        Return (url, locales) of the dictionary for `language` as
+        `find_dictionary_location`, using and updating the index.
+        '''
+        descriptions = (self.describe(origin_url, **request_args)
+            for origin_url in _origins(repos, language))
+        return _select_dictionary(descriptions, language)
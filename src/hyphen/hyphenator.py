@@ -23,22 +23,147 @@
 # the GNU General Public License Version 2 or later (the "GPL"), or
 # the GNU Lesser General Public License Version 2.1 or later (the "LGPL",
 
+import functools
+import itertools
+import re
+import threading
+import time
+import unicodedata
+from array import array
+
 from . import dictools
 from . import hnj
+from .metrics import Metrics
 
 
 __all__ = ['Hyphenator']
 
 
+# Words to be hyphenated by Hyphenator.hyphenate_text, created by _word_pattern
+_WORD = None
+
+
+def _word_pattern():
+    '''
+    Return the pattern of words: runs of letters and combining marks, as in
+    text in NFD, which may contain apostrophes between letters.
+    '''
+    global _WORD
+    if _WORD is None:
+        # re has no class of the Unicode category M. Outside of the first two
+        # planes, combining marks are only the variation selectors of plane 14.
+        marks = []
+        for c in itertools.chain(range(0x20000), range(0xE0000, 0xE1000)):
+            if unicodedata.category(chr(c))[0] != 'M':
+                continue
+            if marks and marks[-1][1] == c - 1:
+                marks[-1][1] = c
+            else:
+                marks.append([c, c])
+        marks = ''.join('%s-%s' % (chr(start), chr(end)) for start, end in marks)
+        _WORD = re.compile(r"[^\W\d_](?:[^\W\d_]|[%s]|['\u2019](?=[^\W\d_]))*" % marks)
+    return _WORD
+
+
+def _cached(apply, maxsize, metrics=None):
+    '''
+    Return `apply` wrapped in a bounded LRU cache keyed by word and mode.
+
+    Cached lists are copied on each hit so that callers may modify them.
+    If given, `metrics` counts the hits as 'cache_hits'.
+    '''
+    # set by each thread whose call is not answered from the cache
+    local = threading.local()
+
+    def miss(word, mode):
+        local.missed = True
+        return apply(word, mode)
+
+    cached_apply = functools.lru_cache(maxsize)(miss)
+
+    def apply_(word, mode):
+        local.missed = False
+        result = cached_apply(word, mode)
+        if metrics and not local.missed:
+            metrics.add('cache_hits')
+        if mode & 1:
+            return [list(pair) for pair in result]
+        if mode & 8:
+            return list(result)
+        return result
+
+    apply_.cache_info = cached_apply.cache_info
+    apply_.cache_clear = cached_apply.cache_clear
+    return apply_
+
+
+def _mode_name(mode):
+    if mode & 1:
+        name = 'pairs'
+    else:
+        name = 'syllables'
+    if mode & 2:
+        name += '_upper'
+    if mode & 4:
+        name += '_title'
+    return name
+
+
+def _unpickle(cls, config):
+    return cls(**config)
+
+
+def _instrumented(func, metrics, event, count=None):
+    '''
+    Return `func`, a method of a hyphenator_ taking a word or words and further
+    arguments such as a mode, wrapped to update `metrics`. event(*args) returns
+    the name of a call given these further arguments.
+    If given, count(result) returns the number of words hyphenated by a call,
+    and `func` is a batch method, which counts the words it skips in a dict.
+    '''
+    def func_(words, *args):
+        name = event(*args)
+        skipped = {}
+        start = time.perf_counter_ns()
+        try:
+            result = func(words, *args, skipped) if count else func(words, *args)
+        except UnicodeError:
+            metrics.add('encode_errors')
+            raise
+        except hnj.WordTooLongError:
+            metrics.add('too_long')
+            raise
+        finally:
+            metrics.add('c_ns', time.perf_counter_ns() - start)
+            metrics.add('calls.' + name)
+        if count:
+            metrics.add('words.' + name, count(result))
+            for event_, value in skipped.items():
+                metrics.add(event_, value)
+        return result
+
+    return func_
+
+
 class Hyphenator:
     """
     Wrapper class around the class 'hnj.hyphenator_' from the C extension.
     It provides convenient access to the C library libhyphen.
+
+    Hyphenator objects are thread-safe: a single instance may be shared by
+    any number of threads. The C extension releases the GIL while
+    hyphenating, so threads hyphenating words run in parallel.
+
+    Hyphenator objects can be pickled, e.g. to pass them to worker processes.
+    They are pickled by their configuration. The unpickled hyphenator uses
+    the same dictionary file without installing anything, and shares the
+    dictionary if the process has loaded it already, as forked processes have.
+    Cached results and metrics are not pickled.
     """
 
     def __init__(self, language='en_US', lmin=2, rmin=2, compound_lmin=2,
-                 compound_rmin=2, directory=None,
-                 **request_args):
+                 compound_rmin=2, directory=None, cache_size=None,
+                 dict_path=None, pack=None, metrics=False, **request_args):
         '''
         Return a hyphenator object initialized with a dictionary for the specified language, typically a locale name.
 
@@ -50,27 +175,113 @@ class Hyphenator:
 
         lmin, rmin, compound_lmin and compound_rmin: set minimum number of chars to be cut off by hyphenation in
         single or compound words
-        
+
+        cache_size: if set, cache the results of up to `cache_size`
+            hyphenations, evicting the least recently used ones.
+            Caching pays off when hyphenating natural-language text in which
+            a small set of words accounts for most calls of `pairs`,
+            `syllables` and `wrap`. The batch methods are not cached.
+
+        dict_path: the path of a dictionary file to be used instead of the
+            installed dictionary for `language`. Nothing is installed, and
+            `directory` and `dictionaries.json` are not accessed.
+
+        pack: the path of a pack file written by `dictools.build_pack`.
+            The dictionary for `language` is loaded from the pack
+            without installing or extracting anything.
+
+        metrics: if true, count calls, rejected words, errors and the time
+            spent in the C extension, see `stats`. If callable, it is also
+            called as metrics(event, value) on each update. The counts are
+            added to those of the dictionary as well, see
+            `dictools.dictionary_stats`. Without metrics, hyphenation
+            costs nothing extra.
+
         **request_args: any kwargs to be  passed on to `requests.get` 
             to configure the HTTP connection if 
             a dictionary needs to be downloaded.
         '''
-        file_path = dictools.install(language, directory=directory, **request_args)
+        if pack:
+            file_path = pack
+        elif dict_path:
+            file_path = dict_path
+        else:
+            file_path = dictools.install(language, directory=directory, **request_args)
         try:
-            self.__hyphenate__ = hnj.hyphenator_(file_path, 
+            # Share the dictionary with other hyphenators using it.
+            if pack:
+                dictionary = dictools.load_pack(pack, language)
+            else:
+                dictionary = dictools.load(file_path)
+            self.__hyphenate__ = hnj.hyphenator_(dictionary, 
                 lmin, rmin, 
                 compound_lmin, compound_rmin)
         except Exception as E:
                 raise RuntimeError(f'C extension    raised  error \
                 when initializing Hyphenator for dictionary at {file_path}') from E
         self.apply = self.__hyphenate__.apply
+        self._apply_batch = self.__hyphenate__.apply_batch
+        self._positions = self.__hyphenate__.positions
+        self._syllable_counts = self.__hyphenate__.syllable_counts
+        self._break_masks = self.__hyphenate__.break_masks
+        self.metrics = None
+        if metrics:
+            self.metrics = Metrics(callback=metrics if callable(metrics) else None,
+                parent=dictools.dictionary_metrics(dictionary))
+            self.apply = _instrumented(self.apply, self.metrics, _mode_name)
+            self._apply_batch = _instrumented(self._apply_batch, self.metrics,
+                lambda mode: _mode_name(mode & 1) + '_many', len)
+            # The index holds an unsigned int per word and one more.
+            self._positions = _instrumented(self._positions, self.metrics,
+                lambda nonstandard: 'positions', lambda result: len(result[1]) // 4 - 1)
+            self._syllable_counts = _instrumented(self._syllable_counts, self.metrics,
+                lambda: 'syllable_counts', len)
+            self._break_masks = _instrumented(self._break_masks, self.metrics,
+                lambda nonstandard: 'break_masks', lambda result: len(result[1]) // 4 - 1)
+        if cache_size:
+            self.apply = _cached(self.apply, cache_size, self.metrics)
         self.language = language
         self.dict_path = file_path
+        self._config = dict(language=language, lmin=lmin, rmin=rmin,
+            compound_lmin=compound_lmin, compound_rmin=compound_rmin,
+            cache_size=cache_size, metrics=bool(metrics))
+        if pack:
+            self._config['pack'] = pack
+        else:
+            self._config['dict_path'] = file_path
+
+    def __reduce__(self):
+        # dict_path skips dictools.install, and dictools.load returns the
+        # dictionary already loaded by the process if any.
+        return _unpickle, (self.__class__, self._config)
 
     def __repr__(self):
         return f"""hyphen.hyphenator.Hyphenator object. 
             language: {self.language}, dictionary at {self.dict_path}"""  
         
+    def cache_info(self):
+        '''
+        Return a named tuple (hits, misses, maxsize, currsize) showing
+        the statistics of the result cache, or None if caching is disabled.
+        '''
+        cache_info = getattr(self.apply, 'cache_info', None)
+        return cache_info() if cache_info else None
+
+    def stats(self):
+        '''
+        Return a dict mapping events to their counts, or None if the hyphenator
+        was created without `metrics`. See `hyphen.metrics.Metrics` for the events.
+        '''
+        return self.metrics.snapshot() if self.metrics else None
+
+    def cache_clear(self):
+        '''
+        Clear the result cache and its statistics.
+        '''
+        cache_clear = getattr(self.apply, 'cache_clear', None)
+        if cache_clear:
+            cache_clear()
+
     def pairs(self, word):
         '''
         Hyphenate a  string and return a list of lists of the form
@@ -80,26 +291,25 @@ class Hyphenator:
 
         * it is not encodable to the dictionary's encoding, or
         * the hyphenator could not find any hyphenation point
+
+        The word is hyphenated lower-cased, and the pairs keep its case,
+        e.g. [['Mc', 'Donald'], ['McDon', 'ald']] for 'McDonald'.
         '''
         if not isinstance(word, str):
             raise TypeError(f'str expected, {type(word)} given.')
 
         # Discard very short words
         if (len(word) < 4) or ('=' in word):
+            if self.metrics:
+                self.metrics.add('rejected')
             return []
-        # Set bit 0 of mode to 1 as we want a list of pairs.      
-        # Set bit 1 if word is capitalized. 
-        # In this case, the 
-        # hyphenator will return    capitalized      word.
-        if word.isupper():
-            word = word.lower()
-            mode = 3
-        else: 
-            mode = 1
+        # Set bit 0 of mode to 1 as we want a list of pairs.
+        # Set bit 4 to have the C extension lower-case the word
+        # and give the pairs the case of the word.
         # Now call the hyphenator catching the case that 'word' is not encodable
         # to the dictionary's encoding.'
         try:
-            return self.apply(word, mode)
+            return self.apply(word, 17)
         except UnicodeError:
             return []
 
@@ -115,25 +325,185 @@ class Hyphenator:
 
         Results are not consistent in case of non-standard hyphenation as a join of the syllables
         would not yield the original word.
+
+        The syllables keep the case of the word as in `pairs`.
         '''
         if not isinstance(word, str):
             raise TypeError(f'str expected, {type(word)} given.')
         # discard very short words
         if (len(word) < 4) or ('=' in word):
+            if self.metrics:
+                self.metrics.add('rejected')
             return []
-        if word.isupper():
-            word = word.lower()
-            mode = 2
-        else: 
-            mode = 0
+        # Set bit 3 of mode to have the C extension split the word into syllables,
+        # and bit 4 to keep the case of the word.
         # Now call the hyphenator catching the case that 'word' is not encodable
         # to the dictionary's encoding.'
-        try:                
-            return self.apply(word, mode).split('=')
+        try:
+            return self.apply(word, 24)
         except UnicodeError:
             return []
 
 
+    def pairs_many(self, words):
+        '''
+        Hyphenate an iterable of strings and return a list containing
+        the result of `pairs` for each word.
+
+        All words are hyphenated by a single call into the C extension.
+        This avoids the per-word overhead of `pairs` when large numbers
+        of words need to be hyphenated.
+        '''
+        # Set bit 0 of mode as we want lists of pairs. The C extension
+        # discards short words and handles the case of words itself.
+        return self._apply_batch(words, 1)
+
+
+    def syllables_many(self, words):
+        '''
+        Hyphenate an iterable of strings and return a list containing
+        the result of `syllables` for each word.
+
+        All words are hyphenated by a single call into the C extension.
+        '''
+        # Set bit 3 of mode to have the C extension split each word into syllables.
+        return self._apply_batch(words, 8)
+
+
+    def positions(self, word):
+        '''
+        Return the hyphenation points of a string as an array('H') of offsets,
+        i.e. the number of characters before each possible hyphen.
+        For example, 'beautiful' yields array('H', [4, 6]).
+
+        Points of non-standard hyphenation are omitted, as the word is
+        changed there. Use `positions_many` with nonstandard=True to get them.
+        '''
+        return array('H', self._positions((word,), False)[0])
+
+
+    def positions_many(self, words, nonstandard=False):
+        '''
+        Return the hyphenation points of an iterable of strings as a tuple
+        (offsets, index, replacements) without creating a str object per point.
+
+        offsets: array('H') of the offsets of all words, see `positions`
+        index: array('I') of len(words) + 1 items. The offsets of the i-th word
+            are offsets[index[i]:index[i + 1]].
+        replacements: a dict describing the points of non-standard hyphenation.
+            These are only included if `nonstandard` is true, and the dict
+            is empty otherwise. It maps (i, offset) to (start, end, before, after):
+            if the i-th word is hyphenated at `offset`, characters
+            start to end of the word are replaced by `before` + hyphen at the
+            end of the line, and by `after` at the beginning of the next line.
+
+        Words are preprocessed as by `pairs_many`.
+        '''
+        offsets, index, replacements = self._positions(words, nonstandard)
+        return array('H', offsets), array('I', index), replacements
+
+
+    def syllable_counts(self, words):
+        '''
+        Return the number of syllables of each of an iterable of strings,
+        i.e. len(self.syllables(word)) for each word, without creating a str
+        object per syllable. For example, ['beautiful', 'the'] yields [3, 0]:
+        words `syllables` returns [] for count 0, and so do words too long
+        to be hyphenated rather than raising ValueError.
+
+        The counts are returned as a read-only memoryview of unsigned bytes
+        on the buffer filled by the C extension, so that e.g.
+        numpy.frombuffer(counts, numpy.uint8) uses it without a copy.
+        Words are preprocessed as by `pairs_many`.
+        '''
+        return memoryview(self._syllable_counts(words))
+
+
+    def break_masks(self, words, nonstandard=False):
+        '''
+        Return the hyphenation points of an iterable of strings as a tuple
+        (masks, index) holding one byte per character.
+
+        masks: the masks of all words as a memoryview of unsigned bytes.
+            A byte is 1 if the word can be hyphenated after the character,
+            and 0 otherwise. For example, 'beautiful' yields
+            [0, 0, 0, 1, 0, 1, 0, 0, 0].
+        index: a memoryview of len(words) + 1 unsigned ints. The mask of the
+            i-th word is masks[index[i]:index[i + 1]], and has len(word) bytes.
+
+        Both are read-only views of the buffers filled by the C extension,
+        which numpy.frombuffer uses without a copy.
+        Points of non-standard hyphenation are 0 unless `nonstandard` is true,
+        in which case they are 2. Words are preprocessed as by `pairs_many`.
+        Words not hyphenated, including words too long to be hyphenated,
+        have a mask of zeros.
+        '''
+        masks, index = self._break_masks(words, nonstandard)
+        return memoryview(masks), memoryview(index).cast('I')
+
+
+    def map(self, words, workers=None, method='syllables', chunksize=1024):
+        '''
+        Hyphenate an iterable of strings using a pool of `workers` threads
+        and return the list of results in the order of `words`.
+
+        method: 'syllables' or 'pairs', selecting the kind of result
+        workers: the number of threads. Defaults to the default of
+            `concurrent.futures.ThreadPoolExecutor`.
+        chunksize: the number of words hyphenated by one batch call
+        '''
+        from concurrent.futures import ThreadPoolExecutor
+
+        batch = {'pairs': self.pairs_many,
+            'syllables': self.syllables_many}[method]
+        words = list(words)
+        chunks = [words[i:i + chunksize] for i in range(0, len(words), chunksize)]
+        result = []
+        with ThreadPoolExecutor(workers) as executor:
+            for chunk in executor.map(batch, chunks):
+                result.extend(chunk)
+        return result
+
+
+    def hyphenate_text(self, lines, hyphen='\u00ad'):
+        '''
+        Insert `hyphen` at all hyphenation points of the words in `lines`
+        and yield the resulting lines one by one.
+
+        lines: an iterable of strings such as a text file opened for reading,
+            or a single string
+        hyphen: the string to be inserted. It defaults to the soft hyphen.
+
+        Whitespace, punctuation and any other text between words is
+        preserved. Words whose hyphenation would change their spelling
+        (non-standard hyphenation) are left unchanged. Each line is
+        hyphenated by a single call into the C extension, so memory use
+        does not depend on the length of the text.
+        '''
+        if isinstance(lines, str):
+            lines = lines.splitlines(keepends=True)
+        word_pattern = _word_pattern()
+        for line in lines:
+            words = word_pattern.findall(line)
+            if not words:
+                yield line
+                continue
+            try:
+                syllables = self.syllables_many(words)
+            except ValueError:
+                # Some word is too long for the C extension.
+                syllables = [self._syllables_or_none(word) for word in words]
+            hyphenated = iter([hyphen.join(s) if s and ''.join(s) == word else word
+                for word, s in zip(words, syllables)])
+            yield word_pattern.sub(lambda match: next(hyphenated), line)
+
+    def _syllables_or_none(self, word):
+        try:
+            return self.syllables(word)
+        except ValueError:
+            return None
+
+
     def wrap(self, word, width, hyphen='-'):
         '''
         Hyphenate 'word' and determine the best hyphenation fitting
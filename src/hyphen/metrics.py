@@ -0,0 +1,78 @@
+# PyHyphen - hyphenation for Python
+# module: metrics
+'''
+This module contains the counters kept by hyphenators created with
+`Hyphenator(metrics=True)` and by the dictionaries they use.
+'''
+
+import os
+import threading
+import weakref
+
+
+__all__ = ['Metrics']
+
+
+# Metrics objects of the process, whose locks are reset in forked processes
+_instances = weakref.WeakSet()
+
+
+def _after_fork_in_child():
+    for metrics in list(_instances):
+        metrics._lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+class Metrics:
+    '''
+    Thread-safe counters of the work done by hyphenators.
+
+    Each counter is named by an event:
+
+    calls.<mode>: calls into the C extension per mode, e.g. 'calls.pairs',
+        'calls.syllables' or 'calls.pairs_many'
+    cache_hits: calls of `pairs` and `syllables` answered from the result cache
+        without calling the C extension
+    words.<method>: words passed to the batch methods such as 'words.pairs_many'
+    rejected: words not hyphenated as they are shorter than 4 characters or
+        contain '=', by `pairs` and `syllables` or by the batch methods
+    encode_errors: words not encodable to the dictionary's encoding
+    too_long: words exceeding the maximum length supported by the C extension,
+        which raise hnj.WordTooLongError or are skipped by `syllable_counts`
+        and `break_masks`
+    c_ns: nanoseconds spent in calls into the C extension
+    load_ns: nanoseconds spent loading a dictionary
+
+    callback: if given, it is called as callback(event, value) on each update,
+        e.g. to forward the counts to a metrics system.
+    parent: if given, another Metrics object updated along with this one, such
+        as those of the dictionary shared by several hyphenators.
+    '''
+
+    def __init__(self, callback=None, parent=None):
+        self.callback = callback
+        self.parent = parent
+        self._counts = {}
+        self._lock = threading.Lock()
+        _instances.add(self)
+
+    def add(self, event, value=1):
+        '''
+        Add `value` to the counter `event`.
+        '''
+        with self._lock:
+            self._counts[event] = self._counts.get(event, 0) + value
+        if self.parent is not None:
+            self.parent.add(event, value)
+        if self.callback is not None:
+            self.callback(event, value)
+
+    def snapshot(self):
+        '''
+        Return a dict mapping the events that occurred to their counts.
+        '''
+        with self._lock:
+            return dict(self._counts)
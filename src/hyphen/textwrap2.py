@@ -1,20 +1,61 @@
+import bisect
 import textwrap
 
 
-__all__ = ['TextWrapper', 'wrap', 'fill']
+__all__ = ['TextWrapper', 'IncrementalWrapper', 'wrap', 'fill', 'wrap_many', 'fill_many']
+
+
+# Whitespace separating words, as in textwrap
+_whitespace = '\t\n\x0b\x0c\r '
+
+
+def _is_space(chunk):
+    return not chunk.strip(_whitespace)
+
+
+# Kinds of break points used by the optimal line breaker.
+_SPACE, _CHUNK, _HYPHEN = range(3)
+
+
+class _HyphenatedChunk(str):
+    """Rest of a chunk hyphenated at the end of a line. The attribute
+    breaks holds the offsets at which it may be hyphenated further."""
 
 
 class TextWrapper(textwrap.TextWrapper):
     """
     This class extends the Python 3 standard library's TextWrapper and adds an optional
     use_hyphenator to its constructor arguments.
+
+    break_mode: 'greedy' (default) fills each line with as many words as fit,
+        hyphenating only the word that overflows. 'optimal' hyphenates
+        every word once and chooses the line breaks which minimize the sum
+        of the squared free space at the end of all lines but the last one
+        (minimum raggedness), as in the Knuth-Plass algorithm.
+        max_lines is not supported by the optimal mode, which then
+        falls back to greedy wrapping.
+    hyphen_penalty: cost of a line ending with a hyphen in the optimal mode,
+        in squared characters. The default of 25 prefers a hyphen to
+        5 more characters of free space.
+    consecutive_hyphen_penalty: additional cost of a hyphen at the end of
+        two consecutive lines in the optimal mode.
     """
 
     def __init__(self, *args, **kwargs):
         self.use_hyphenator = kwargs.pop("use_hyphenator", None)
+        self.break_mode = kwargs.pop("break_mode", "greedy")
+        self.hyphen_penalty = kwargs.pop("hyphen_penalty", 25)
+        self.consecutive_hyphen_penalty = kwargs.pop("consecutive_hyphen_penalty", 100)
+        if self.break_mode not in ('greedy', 'optimal'):
+            raise ValueError("invalid break_mode %r" % self.break_mode)
         super().__init__(*args, **kwargs)
 
     def _wrap_chunks(self, chunks):
+        if self.break_mode == 'optimal' and self.max_lines is None:
+            return self._wrap_chunks_optimal(chunks)
+        return self._wrap_chunks_greedy(chunks)
+
+    def _wrap_chunks_greedy(self, chunks):
         """Override the mother class method.
 
         Most of that method is directly copied from the original class, except
@@ -37,12 +78,6 @@ class TextWrapper(textwrap.TextWrapper):
 
         while chunks:
 
-            # Start the list of chunks that will make up the current line.
-            # cur_len is just the length of all the chunks in cur_line.
-            cur_line = []
-            cur_len = 0
-            hyphenated_last = False
-
             # Figure out which static string will prefix this line.
             if lines:
                 indent = self.subsequent_indent
@@ -52,40 +87,7 @@ class TextWrapper(textwrap.TextWrapper):
             # Maximum width for this line.
             width = self.width - len(indent)
 
-            # First chunk on line is whitespace -- drop it, unless this
-            # is the very beginning of the text (ie. no lines started yet).
-            if self.drop_whitespace and chunks[-1].strip() == '' and lines:
-                del chunks[-1]
-
-            while chunks:
-                l = len(chunks[-1])
-
-                # Can at least squeeze this chunk onto the current line.
-                if cur_len + l <= width:
-                    cur_line.append(chunks.pop())
-                    cur_len += l
-
-                # Nope, this line is full.
-                # But try hyphenation.
-                else:
-                    if self.use_hyphenator and (width - cur_len >= 2):
-                        hyphenated_chunk = self.use_hyphenator.wrap(chunks[-1], width - cur_len)
-                        if hyphenated_chunk:
-                            cur_line.append(hyphenated_chunk[0])
-                            chunks[-1] = hyphenated_chunk[1]
-                            hyphenated_last = True
-                    break
-
-            # The current line is full, and the next chunk is too big to
-            # fit on *any* line (not just this one).
-            if chunks and len(chunks[-1]) > width and not hyphenated_last:
-                self._handle_long_word(chunks, cur_line, cur_len, width)
-                cur_len = sum(map(len, cur_line))
-
-            # If the last chunk on this line is all whitespace, drop it.
-            if self.drop_whitespace and cur_line and cur_line[-1].strip() == '':
-                cur_len -= len(cur_line[-1])
-                del cur_line[-1]
+            cur_line, cur_len = self._fill_line(chunks, width, not lines)
 
             if cur_line:
                 if (self.max_lines is None or
@@ -118,6 +120,397 @@ class TextWrapper(textwrap.TextWrapper):
 
         return lines
 
+    def _fill_line(self, chunks, width, first):
+        """Pop chunks from the reversed list chunks to fill one line
+        of at most width characters, and return (cur_line, cur_len).
+        first is true if no line has been started yet.
+        """
+        # Start the list of chunks that will make up the current line.
+        # cur_len is just the length of all the chunks in cur_line.
+        cur_line = []
+        cur_len = 0
+        hyphenated_last = False
+
+        # First chunk on line is whitespace -- drop it, unless this
+        # is the very beginning of the text (ie. no lines started yet).
+        if self.drop_whitespace and chunks[-1].strip() == '' and not first:
+            del chunks[-1]
+
+        while chunks:
+            l = len(chunks[-1])
+
+            # Can at least squeeze this chunk onto the current line.
+            if cur_len + l <= width:
+                cur_line.append(chunks.pop())
+                cur_len += l
+
+            # Nope, this line is full.
+            # But try hyphenation.
+            else:
+                if self.use_hyphenator and (width - cur_len >= 2):
+                    hyphenated_chunk = self._hyphenate(chunks[-1], width - cur_len)
+                    if hyphenated_chunk:
+                        cur_line.append(hyphenated_chunk[0])
+                        chunks[-1] = hyphenated_chunk[1]
+                        hyphenated_last = True
+                break
+
+        # The current line is full, and the next chunk is too big to
+        # fit on *any* line (not just this one).
+        if chunks and len(chunks[-1]) > width and not hyphenated_last:
+            self._handle_long_word(chunks, cur_line, cur_len, width)
+            cur_len = sum(map(len, cur_line))
+
+        # If the last chunk on this line is all whitespace, drop it.
+        if self.drop_whitespace and cur_line and cur_line[-1].strip() == '':
+            cur_len -= len(cur_line[-1])
+            del cur_line[-1]
+
+        return cur_line, cur_len
+
+    def _hyphenate(self, chunk, width, hyphen='-'):
+        """Return the result of self.use_hyphenator.wrap(chunk, width).
+
+        The rest of a hyphenated chunk carries the offsets at which it may
+        be hyphenated further. So a chunk spanning several lines is
+        hyphenated only once, and each line is fitted by a binary search.
+        """
+        breaks = getattr(chunk, 'breaks', None)
+        if breaks is None:
+            positions_many = getattr(self.use_hyphenator, 'positions_many', None)
+            if positions_many is None:
+                return self.use_hyphenator.wrap(chunk, width, hyphen)
+            offsets, _, replacements = positions_many((chunk,), True)
+            if replacements:
+                # Non-standard hyphenation changes the chunk.
+                return self.use_hyphenator.wrap(chunk, width, hyphen)
+            breaks = offsets, 0, 0
+        # offsets[lo:] minus base are the offsets into chunk.
+        offsets, lo, base = breaks
+        # Find the last offset fitting into width including the hyphen,
+        # which is not added after a hyphen already there.
+        i = bisect.bisect_right(offsets, base + width - len(hyphen) + 1, lo)
+        while i > lo:
+            offset = offsets[i - 1] - base
+            head = chunk[:offset]
+            if head.endswith(hyphen):
+                break
+            if offset + len(hyphen) <= width:
+                head += hyphen
+                break
+            i -= 1
+        else:
+            return []
+        rest = _HyphenatedChunk(chunk[offset:])
+        rest.breaks = offsets, i, base + offset
+        return [head, rest]
+
+    def _hyphenation_points(self, chunks):
+        """Return a dict mapping each distinct word of chunks
+        to the offsets at which it may be hyphenated.
+        """
+        if not self.use_hyphenator:
+            return {}
+        words = list({chunk for chunk in chunks if len(chunk) >= 4 and chunk.strip()})
+        positions_many = getattr(self.use_hyphenator, 'positions_many', None)
+        if positions_many:
+            try:
+                offsets, index, _ = positions_many(words)
+                return {word: offsets[index[i]:index[i + 1]]
+                    for i, word in enumerate(words)}
+            except ValueError:
+                # Some word is too long for the C extension.
+                pass
+        points = {}
+        for word in words:
+            try:
+                pairs = self.use_hyphenator.pairs(word)
+            except ValueError:
+                pairs = []
+            # Skip non-standard hyphenations, which change the word.
+            points[word] = [len(a) for a, b in pairs if a + b == word]
+        return points
+
+    def _wrap_chunks_optimal(self, chunks):
+        """Wrap chunks with minimum raggedness.
+
+        The chunks are cut into pieces at all hyphenation points, and
+        break points are collected: after each run of whitespace, between
+        two words such as 'well-' and 'known', and at each hyphenation
+        point. Then, for each break point, the cheapest way of breaking the
+        text before it is found by dynamic programming, considering only
+        lines which fit into the width. So the run time is linear in the
+        length of the text times the number of words per line.
+        """
+        if self.width <= 0:
+            raise ValueError("invalid width %r (must be > 0)" % self.width)
+        hyphen = '-'
+        widths = (self.width - len(self.initial_indent),
+            self.width - len(self.subsequent_indent))
+        max_piece = max(1, min(widths))
+        points = self._hyphenation_points(chunks)
+
+        # pieces of text; ends[i] is the length of the text up to the end of pieces[i]
+        pieces, ends = [], []
+        # break points: the number of pieces before them, their kind and
+        # the length of the whitespace preceding them
+        breaks, kinds, spaces = [0], [None], [0]
+        length = 0
+
+        def add_piece(piece, kind=None, space=0):
+            nonlocal length
+            pieces.append(piece)
+            length += len(piece)
+            ends.append(length)
+            if kind is not None:
+                add_break(kind, space)
+
+        def add_break(kind, space=0):
+            breaks.append(len(pieces))
+            kinds.append(kind)
+            spaces.append(space)
+
+        for chunk in chunks:
+            if not chunk.strip():
+                add_piece(chunk, _SPACE, len(chunk))
+                continue
+            if pieces and pieces[-1].strip():
+                add_break(_CHUNK)
+            start = 0
+            for end in list(points.get(chunk, ())) + [len(chunk)]:
+                # A piece before a hyphenation point leaves room for the hyphen.
+                limit = max_piece
+                if end < len(chunk) and not chunk[:end].endswith(hyphen):
+                    limit -= len(hyphen)
+                    if limit < 1:
+                        continue
+                # Break pieces too long for any line if requested, leaving
+                # at least one character for the last piece.
+                while self.break_long_words and end - start > limit:
+                    size = min(max_piece, end - start - 1)
+                    add_piece(chunk[start:start + size], _CHUNK)
+                    start += size
+                add_piece(chunk[start:end], _HYPHEN if end < len(chunk) else None)
+                start = end
+        if not pieces:
+            return []
+        if breaks[-1] != len(pieces):
+            add_break(_SPACE)
+
+        # The length of the line from break point a to b is ends_at[b] - starts_at[a].
+        starts_at = [ends[i - 1] if i else 0 for i in breaks]
+        ends_at = [start - space if self.drop_whitespace else start
+            for start, space in zip(starts_at, spaces)]
+        for b, kind in enumerate(kinds):
+            if kind == _HYPHEN and not pieces[breaks[b] - 1].endswith(hyphen):
+                ends_at[b] += len(hyphen)
+
+        last = len(breaks) - 1
+        costs = [0] + [float('inf')] * last
+        previous = [0] * len(breaks)
+
+        def consider(a, b):
+            """Consider the line from break point a to b. Return False if it
+            is too long, and a line from a later break point may end at b."""
+            n = ends_at[b] - starts_at[a]
+            width = widths[a > 0]
+            if n > width:
+                if a < b - 1:
+                    return False
+                # Overfull line that cannot be avoided
+                cost = costs[a] + 1e6 * (n - width)
+            elif b == last:
+                cost = costs[a]
+            else:
+                cost = costs[a] + (width - n) ** 2
+            if kinds[b] == _HYPHEN:
+                cost += self.hyphen_penalty
+                if kinds[a] == _HYPHEN:
+                    cost += self.consecutive_hyphen_penalty
+            if cost < costs[b]:
+                costs[b] = cost
+                previous[b] = a
+            return True
+
+        # Lines from break points before 'first' are too long for all break
+        # points to come, and so is the first line unless 'first_fits'.
+        # The first line is checked on its own, as its width may differ.
+        first, first_fits = 1, True
+        for b in range(1, len(breaks)):
+            for a in range(b - 1, first - 1, -1):
+                if not consider(a, b):
+                    first = a + 1
+                    break
+            if first_fits and not consider(0, b):
+                first_fits = False
+
+        lines = []
+        b = last
+        while b:
+            a = previous[b]
+            end = breaks[b]
+            if self.drop_whitespace:
+                while end > breaks[a] and not pieces[end - 1].strip():
+                    end -= 1
+            line = ''.join(pieces[breaks[a]:end])
+            if kinds[b] == _HYPHEN and not line.endswith(hyphen):
+                line += hyphen
+            lines.append(line)
+            b = a
+        lines.reverse()
+        return [(self.subsequent_indent if i else self.initial_indent) + line
+            for i, line in enumerate(lines)
+            if line or not self.drop_whitespace]
+
+
+class IncrementalWrapper(TextWrapper):
+    """
+    Wrap a single text with greedy line breaking, and re-wrap it after each
+    edit by re-flowing only the lines affected, e.g. in an editor preview.
+
+    The attribute `lines` holds the wrapped lines, which are always equal to
+    `wrap(text, ...)`. The attribute `text` holds the text after whitespace
+    munging (expand_tabs and replace_whitespace), and edits are given in
+    positions of it. Inserted text is munged on its own.
+
+    break_mode='optimal', max_lines and fix_sentence_endings are not supported,
+    as they make line breaks depend on the entire text.
+
+    Example::
+
+        >>> w = IncrementalWrapper('A thing of beauty is a joy forever.', width=10)
+        >>> w.edit(2, 7, 'joy')
+        (0, 1, ['A joy of'])
+    """
+
+    def __init__(self, text='', width=70, **kwargs):
+        super().__init__(width=width, **kwargs)
+        if self.break_mode != 'greedy' or self.max_lines is not None or self.fix_sentence_endings:
+            raise ValueError("IncrementalWrapper supports neither break_mode='optimal', "
+                "max_lines nor fix_sentence_endings")
+        if self.width <= 0:
+            raise ValueError("invalid width %r (must be > 0)" % self.width)
+        self.text = self._munge_whitespace(text)
+        self._chunks = self._split(self.text)
+        # For each line: the number of the chunk it starts with, the position
+        # of that chunk in text, and whether the line starts at the beginning
+        # of the chunk rather than with the rest of a hyphenated word.
+        self.lines, self._starts, self._offsets, self._whole = [], [], [], []
+        for line, start, offset, whole in self._reflow(0, 0, True):
+            self.lines.append(line)
+            self._starts.append(start)
+            self._offsets.append(offset)
+            self._whole.append(whole)
+
+    def _reflow(self, i, offset, first):
+        """Wrap the chunks from the i-th one, which is at position offset of
+        the text, and yield (line, start, offset, whole) for each line as
+        described in __init__. first is true if no line precedes them.
+        """
+        chunks = self._chunks
+        # A line consumes at most width + 2 chunks, and looks at the next one.
+        margin = 2 * self.width + 4
+        stack, end = [], i
+        while True:
+            if len(stack) < margin and end < len(chunks):
+                # Add chunks to the bottom of the reversed stack.
+                new_end = min(len(chunks), end + 4 * margin)
+                stack = chunks[end:new_end][::-1] + stack
+                end = new_end
+            if not stack:
+                return
+            start = end - len(stack)
+            while i < start:
+                offset += len(chunks[i])
+                i += 1
+            whole = stack[-1] is chunks[start]
+            indent = self.initial_indent if first else self.subsequent_indent
+            cur_line, cur_len = self._fill_line(stack, self.width - len(indent), first)
+            if cur_line:
+                yield indent + ''.join(cur_line), start, offset, whole
+                first = False
+
+    def _can_restart(self, k, word):
+        """Return True if re-wrapping may start with the k-th line
+        after an edit of the word at position word.
+        """
+        i = self._starts[k]
+        space = _is_space(self._chunks[i])
+        if not self._whole[k] or space == _is_space(self._chunks[i - 1]):
+            return False
+        return self._offsets[k] + (len(self._chunks[i]) if space else 0) < word
+
+    def edit(self, start, end, text):
+        """
+        Replace text[start:end] by `text` and re-wrap.
+
+        Return a tuple (first, last, lines) meaning that the lines
+        self.lines[first:last] have been replaced by `lines`.
+        Re-wrapping starts one line before the edit and stops as soon as
+        a line starts at the same word as before the edit.
+        """
+        if not 0 <= start <= end <= len(self.text):
+            raise ValueError("invalid range %r:%r" % (start, end))
+        text = self._munge_whitespace(text)
+        delta = len(text) - (end - start)
+        self.text = self.text[:start] + text + self.text[end:]
+
+        # Restart at the line before the one containing the word edited,
+        # as words may move up to it. Go back further until a line starts
+        # with whitespace or a word preceded by whitespace, and its first
+        # word is before the word edited. Then splitting the text from there
+        # yields the same chunks as splitting all of it, and the lines before
+        # do not change.
+        word = start
+        while word and self.text[word - 1] not in _whitespace:
+            word -= 1
+        k = max(bisect.bisect_right(self._offsets, word) - 2, 0)
+        while k and not self._can_restart(k, word):
+            k -= 1
+        i, offset = (self._starts[k], self._offsets[k]) if k else (0, 0)
+
+        # Split the text again up to the first whitespace after the edit.
+        chunks = self._chunks
+        j, old_end = i, offset
+        while j < len(chunks) and (old_end <= end or not _is_space(chunks[j])):
+            old_end += len(chunks[j])
+            j += 1
+        new_chunks = self._split(self.text[offset:old_end + delta])
+        self._chunks[i:j] = new_chunks
+        shift = len(new_chunks) - (j - i)
+
+        # Re-wrap until a line starts at a chunk after the split text
+        # which started a line before the edit.
+        lines, starts, offsets, whole = [], [], [], []
+        converged = len(self.lines)
+        old = k
+        for line, line_start, line_offset, line_whole in self._reflow(i, offset, k == 0):
+            if lines and line_whole and line_start >= i + len(new_chunks):
+                while old < len(self.lines) and self._starts[old] < line_start - shift:
+                    old += 1
+                if old < len(self.lines) and self._starts[old] == line_start - shift \
+                        and self._whole[old] and old > 0:
+                    converged = old
+                    break
+            lines.append(line)
+            starts.append(line_start)
+            offsets.append(line_offset)
+            whole.append(line_whole)
+
+        old_lines = self.lines[k:converged]
+        self.lines[k:converged] = lines
+        self._starts[k:] = starts + [s + shift for s in self._starts[converged:]]
+        self._offsets[k:] = offsets + [o + delta for o in self._offsets[converged:]]
+        self._whole[k:converged] = whole
+
+        # Report only the lines which changed.
+        first, last = 0, 0
+        while first < min(len(lines), len(old_lines)) and lines[first] == old_lines[first]:
+            first += 1
+        while last < min(len(lines), len(old_lines)) - first \
+                and lines[-1 - last] == old_lines[-1 - last]:
+            last += 1
+        return k + first, k + len(old_lines) - last, lines[first:len(lines) - last]
 
 
 
@@ -130,3 +523,92 @@ def wrap(text, width=70, **kwargs):
 def fill(text, width=70, **kwargs):
     w = TextWrapper(width=width, **kwargs)
     return w.fill(text)
+
+
+# bulk processing in worker processes
+
+# TextWrapper of a worker process, created by _init_worker
+_worker_wrapper = None
+
+
+def _init_worker(width, hyphenator_language, directory, kwargs):
+    global _worker_wrapper
+    if hyphenator_language:
+        from .hyphenator import Hyphenator
+        kwargs = dict(kwargs, use_hyphenator=Hyphenator(hyphenator_language, directory=directory))
+    _worker_wrapper = TextWrapper(width=width, **kwargs)
+
+
+def _fill_worker(text):
+    return _worker_wrapper.fill(text)
+
+
+def _wrap_worker(text):
+    return _worker_wrapper.wrap(text)
+
+
+def _map_many(worker, texts, width, hyphenator_language, processes, chunksize,
+              directory, precompile, kwargs):
+    import itertools
+    import multiprocessing
+    import os
+    from collections import deque
+
+    if hyphenator_language:
+        # Install the dictionary once rather than in each worker. A precompiled
+        # dictionary is mapped into memory by the workers, which share its pages.
+        from . import dictools
+        dictools.install(hyphenator_language, directory=directory, precompile=precompile)
+    processes = processes or os.cpu_count() or 1
+    texts = iter(texts)
+    pending = deque()
+    with multiprocessing.Pool(processes, _init_worker,
+                              (width, hyphenator_language, directory, kwargs)) as pool:
+        # Unlike Pool.imap, keep at most two chunks per worker in flight, and
+        # read the next chunk only when the results of one are yielded.
+        while True:
+            while len(pending) < 2 * processes:
+                chunk = list(itertools.islice(texts, chunksize))
+                if not chunk:
+                    break
+                pending.append(pool.map_async(worker, chunk, len(chunk)))
+            if not pending:
+                return
+            yield from pending.popleft().get()
+
+
+def fill_many(texts, width=70, hyphenator_language=None, processes=None,
+              chunksize=64, directory=None, precompile=False, **kwargs):
+    '''
+    Fill each of an iterable of texts as `fill` does, using a pool of
+    `processes` worker processes, and yield the results in order.
+
+    hyphenator_language: if given, hyphenate with a Hyphenator for this
+        language. Each worker creates it once. The dictionary is installed
+        by the calling process.
+    processes: the number of worker processes. Defaults to os.cpu_count().
+    chunksize: the number of texts sent to a worker at a time. Larger
+        chunks reduce the overhead of inter-process communication.
+    directory: the dictionary directory, see `Hyphenator`
+    precompile: if True, the calling process also precompiles the dictionary
+        of `hyphenator_language`, see `dictools.install`. Default: False
+    **kwargs: passed on to TextWrapper. They must be picklable.
+        A Hyphenator passed as `use_hyphenator` is pickled by its
+        configuration, see `Hyphenator`.
+
+    Texts are read in chunks as the results are consumed, with at most two
+    chunks per worker in flight, so `texts` may be a generator of
+    unlimited length.
+    '''
+    return _map_many(_fill_worker, texts, width, hyphenator_language,
+        processes, chunksize, directory, precompile, kwargs)
+
+
+def wrap_many(texts, width=70, hyphenator_language=None, processes=None,
+              chunksize=64, directory=None, precompile=False, **kwargs):
+    '''
+    Wrap each of an iterable of texts as `wrap` does and yield the lists of lines.
+    See `fill_many` for details.
+    '''
+    return _map_many(_wrap_worker, texts, width, hyphenator_language,
+        processes, chunksize, directory, precompile, kwargs)
@@ -1,7 +1,17 @@
+import asyncio
+import errno
+import functools
+import http.server
 import os
 import shutil
 import tempfile
+import multiprocessing
+import threading
+import time
 import unittest
+from unittest import mock
+
+import requests
 
 import hyphen.dictools
 
@@ -32,6 +42,22 @@ class TestDictools(unittest.TestCase):
         self.assertTrue(os.path.exists(directory))
         self.assertTrue(os.path.exists(dictionaries.path))
 
+    def test_dictionaries_json_is_cached(self):
+        directory = os.path.join(self.directory, "mydir")
+        self.assertEqual([], hyphen.dictools.list_installed(directory))
+        self.assertFalse(os.path.exists(directory))
+
+        dictionaries = hyphen.dictools.Dictionaries(directory)
+        dictionaries.add("en", b"content", ["en_US", "en_GB"], "http://source.com")
+        # Served from the cache without reading the file
+        with mock.patch('json.load', side_effect=AssertionError):
+            self.assertEqual(['en_GB', 'en_US'], hyphen.dictools.list_installed(directory))
+
+        # Changes by other processes are seen
+        with open(dictionaries.path, 'w') as f:
+            f.write('{"fr_FR": {"file": "hyph_fr.dic", "url": "http://pouac.com"}}')
+        self.assertEqual(['fr_FR'], hyphen.dictools.list_installed(directory))
+
     def test_list_installed(self):
         dictionaries = hyphen.dictools.Dictionaries(self.directory)
         dictionaries.add("fr_FR", b"content", ['fr_BE', 'fr_FR'], "http://pouac.com")
@@ -58,3 +84,191 @@ class TestDictools(unittest.TestCase):
             url, locales = hyphen.dictools.parse_dictionary_location(xcu.read(), origin_url, "fr_FR")
             self.assertEqual("http://pouac.com/hyph_fr.dic", url)
             self.assertEqual(["fr_FR", "fr_BE", "fr_CA", "fr_CH", "fr_MC", "fr_LU"], locales)
+
+    def test_precompile(self):
+        with open(hyphen.dictools.install('en_US'), 'rb') as f:
+            content = f.read()
+        dictionaries = hyphen.dictools.Dictionaries(self.directory)
+        filepath = dictionaries.add("en_US", content, ['en_US'], "http://pouac.com")
+        self.assertEqual(filepath, hyphen.dictools.loadable_path(filepath))
+
+        compiled = hyphen.dictools.precompile('en_US', directory=self.directory)
+        self.assertTrue(os.path.exists(compiled))
+        self.assertEqual(compiled, hyphen.dictools.loadable_path(filepath))
+
+        h_en = hyphen.Hyphenator('en_US', directory=self.directory)
+        self.assertEqual([['beau', 'tiful'], ['beauti', 'ful']], h_en.pairs('beautiful'))
+        # Mapped dictionaries ignore the threshold for dense transition tables
+        dense = hyphen.hnj.hyphenator_(hyphen.hnj.dictionary_(compiled, 1), 2, 2, 2, 2)
+        self.assertEqual(h_en.pairs('beautiful'), dense.apply('beautiful', 1))
+
+        hyphen.dictools.uninstall('en_US', directory=self.directory)
+        self.assertFalse(os.path.exists(compiled))
+
+    def test_pack(self):
+        for language in ('en_US', 'fr_FR'):
+            hyphen.dictools.install(language)
+        pack = hyphen.dictools.build_pack(os.path.join(self.directory, 'dictionaries.zip'),
+            ['en_US', 'fr_FR', 'en_PH'])
+        self.assertEqual(['en_PH', 'en_US', 'fr_FR'], hyphen.dictools.list_pack(pack))
+        # Precompiled dictionaries are stored aligned for mapping
+        members = hyphen.dictools._read_pack(pack)[3]
+        self.assertEqual(2, len(members))
+        self.assertTrue(all(offset % 8 == 0 for offset, size in members.values()))
+
+        dictionary = hyphen.dictools.load_pack(pack, 'en_PH')
+        self.assertIs(dictionary, hyphen.dictools.load_pack(pack, 'en_US'))
+        self.assertIn(os.path.join(os.path.realpath(pack), 'hyph_en_US.dic'),
+            hyphen.dictools.list_loaded())
+        with self.assertRaises(IOError):
+            hyphen.dictools.load_pack(pack, 'de_DE')
+
+        h_fr = hyphen.Hyphenator('fr_FR', pack=pack)
+        self.assertEqual(hyphen.Hyphenator('fr_FR').pairs('anticonstitutionnellement'),
+            h_fr.pairs('anticonstitutionnellement'))
+
+        # Without precompiled dictionaries, the dictionary files are parsed
+        pack = hyphen.dictools.build_pack(os.path.join(self.directory, 'portable.zip'),
+            ['en_US'], precompiled=False)
+        h_en = hyphen.Hyphenator('en_US', pack=pack)
+        self.assertEqual([['beau', 'tiful'], ['beauti', 'ful']], h_en.pairs('beautiful'))
+
+    def serve_repository(self, delay=0):
+        '''
+        Serve a repository with the fixtures from a local HTTP server,
+        delaying each response by `delay` seconds.
+        Return its url and the list of (path, status) of the requests it receives.
+        '''
+        repository = os.path.join(self.directory, 'repository')
+        shutil.copytree(os.path.join(os.path.dirname(__file__), 'fixtures'), repository)
+        with open(hyphen.dictools.install('en_US'), 'rb') as f:
+            content = f.read()
+        for path in ('en/hyph_en_US.dic', 'en/hyph_en_GB.dic', 'fr_FR/hyph_fr.dic'):
+            with open(os.path.join(repository, path), 'wb') as f:
+                f.write(content)
+
+        requested = []
+
+        class Handler(http.server.SimpleHTTPRequestHandler):
+            def do_GET(self):
+                time.sleep(delay)
+                super().do_GET()
+
+            def log_request(self, code='-', size='-'):
+                requested.append((self.path, int(code)))
+
+            def log_message(self, format, *args):
+                pass
+
+        server = http.server.ThreadingHTTPServer(('127.0.0.1', 0),
+            functools.partial(Handler, directory=repository))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.server = server
+        return 'http://127.0.0.1:%d/' % server.server_address[1], requested
+
+    def test_install_many(self):
+        repos, requested = self.serve_repository()
+        paths_requested = lambda: [path for path, _status in requested]
+
+        directory = os.path.join(self.directory, 'dictionaries')
+        paths = asyncio.run(hyphen.dictools.install_many(
+            ['en_US', 'fr_FR', 'en_PH', 'en_US'], directory=directory,
+            repos=repos, precompile=True, concurrency=3))
+
+        self.assertEqual(['en_PH', 'en_US', 'fr_FR'], sorted(paths))
+        self.assertEqual(os.path.join(directory, 'hyph_fr_FR.dic'), paths['fr_FR'])
+        self.assertEqual(['en_PH', 'en_US', 'fr_BE', 'fr_CA', 'fr_CH', 'fr_FR', 'fr_LU', 'fr_MC'],
+            hyphen.dictools.list_installed(directory))
+        # Each file is downloaded once
+        self.assertEqual(1, paths_requested().count('/en/dictionaries.xcu'))
+        self.assertEqual(1, paths_requested().count('/en/hyph_en_US.dic'))
+        self.assertTrue(os.path.exists(hyphen.dictools.compiled_path(paths['fr_FR'])))
+
+        h_fr = hyphen.Hyphenator('fr_FR', directory=directory)
+        self.assertEqual([['beau', 'tiful'], ['beauti', 'ful']], h_fr.pairs('beautiful'))
+
+        # The synchronous install uses the same repository and index
+        path = hyphen.dictools.install('en_GB', directory=directory, repos=repos)
+        self.assertEqual(os.path.join(directory, 'hyph_en_GB.dic'), path)
+        self.assertEqual(1, paths_requested().count('/en/dictionaries.xcu'))
+        self.assertIn('/en/hyph_en_GB.dic', paths_requested())
+
+    def test_repository_index(self):
+        repos, requested = self.serve_repository()
+        index = hyphen.dictools.RepositoryIndex(self.directory)
+
+        self.assertEqual((repos + 'en/hyph_en_US.dic', ['en_US', 'en_PH']),
+            index.locate(repos, 'en_US'))
+        self.assertEqual([('/en_US/dictionaries.xcu', 404), ('/en/dictionaries.xcu', 200)],
+            requested)
+        with self.assertRaises(IOError):
+            index.locate(repos, 'en_XX')
+
+        # Other locales of the folder are resolved without downloading it again
+        index = hyphen.dictools.RepositoryIndex(self.directory)
+        self.assertEqual(repos + 'en/hyph_en_GB.dic', index.locate(repos, 'en_GB')[0])
+        self.assertEqual(repos + 'en/hyph_en_GB.dic', index.locate(repos, 'en')[0])
+        self.assertEqual([('/en_XX/dictionaries.xcu', 404), ('/en_GB/dictionaries.xcu', 404)],
+            requested[2:])
+        self.assertEqual(repos + 'en/hyph_en_GB.dic', index.locate(repos, 'en_GB')[0])
+        self.assertEqual(4, len(requested))
+
+        # Expired entries are revalidated
+        index = hyphen.dictools.RepositoryIndex(self.directory, max_age=0)
+        self.assertEqual(repos + 'en/hyph_en_US.dic', index.locate(repos, 'en_PH')[0])
+        self.assertEqual([('/en_PH/dictionaries.xcu', 404), ('/en/dictionaries.xcu', 304)],
+            requested[4:])
+
+        # Expired entries are used if the repository cannot be reached
+        self.server.shutdown()
+        self.server.server_close()
+        self.assertEqual(repos + 'en/hyph_en_US.dic', index.locate(repos, 'en_US')[0])
+        with self.assertRaises(requests.ConnectionError):
+            index.locate(repos, 'de_DE')
+
+    def test_concurrent_install(self):
+        repos, requested = self.serve_repository(delay=0.2)
+        directory = os.path.join(self.directory, 'dictionaries')
+        install = functools.partial(hyphen.dictools.install, directory=directory, repos=repos)
+
+        # Processes installing the same language download it once
+        with multiprocessing.get_context('spawn').Pool(3) as pool:
+            paths = pool.map(install, ['en_US'] * 3)
+        self.assertEqual([os.path.join(directory, 'hyph_en_US.dic')] * 3, paths)
+        self.assertEqual(1, requested.count(('/en/hyph_en_US.dic', 200)))
+
+        # Concurrent updates of dictionaries.json are not lost
+        dictionaries = hyphen.dictools.Dictionaries(directory)
+        threads = [threading.Thread(target=dictionaries.add,
+            args=('xx_%d' % i, b'content', ['xx_%d' % i], 'http://pouac.com'))
+            for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(['en_PH', 'en_US'] + ['xx_%d' % i for i in range(8)],
+            hyphen.dictools.list_installed(directory))
+        # No temporary files are left behind
+        self.assertEqual([], [name for name in os.listdir(directory) if name.endswith('.tmp')])
+
+    def test_file_lock_windows(self):
+        path = os.path.join(self.directory, 'lock')
+        msvcrt = mock.Mock(LK_NBLCK=2, LK_UNLCK=0)
+        with mock.patch.object(hyphen.dictools, 'fcntl', None), \
+                mock.patch.object(hyphen.dictools, 'msvcrt', msvcrt, create=True), \
+                mock.patch.object(hyphen.dictools.time, 'sleep') as sleep:
+            # The lock held by another process is retried with growing delays
+            msvcrt.locking.side_effect = [OSError(errno.EACCES, 'locked'),
+                OSError(errno.EDEADLOCK, 'locked'), None, None]
+            with hyphen.dictools._FileLock(path):
+                self.assertEqual(3, msvcrt.locking.call_count)
+            self.assertEqual([mock.call(0.01), mock.call(0.02)], sleep.call_args_list)
+
+            # Other errors are raised at once
+            msvcrt.locking.reset_mock()
+            msvcrt.locking.side_effect = OSError(errno.EBADF, 'bad file descriptor')
+            with self.assertRaises(OSError):
+                hyphen.dictools._FileLock(path).acquire()
+            self.assertEqual(1, msvcrt.locking.call_count)
@@ -1,5 +1,14 @@
+import importlib.util
+import io
+import multiprocessing
+import os
+import pickle
+import subprocess
+import sys
+import unicodedata
 import unittest
-from hyphen import Hyphenator
+from unittest import mock
+from hyphen import Hyphenator, dictools, hnj
 
 
 class TestHyphenator(unittest.TestCase):
@@ -35,3 +44,337 @@ class TestHyphenator(unittest.TestCase):
             h_en.pairs('PANDEMIC')
         )
 
+
+    def test_mixed_case(self):
+        h_en = Hyphenator('en_US')
+        self.assertEqual([['Mc', 'Donald'], ['McDon', 'ald']], h_en.pairs('McDonald'))
+        self.assertEqual(['Hy', 'phen', 'ation'], h_en.syllables('Hyphenation'))
+        self.assertEqual(['Pow', 'er', 'Point'], h_en.syllables('PowerPoint'))
+        # Words whose length str.lower changes are cased as a whole,
+        # 'İ' becoming 'I' with a combining dot
+        self.assertEqual([['I\u0307S', 'TANBUL'], ['I\u0307STAN', 'BUL']], h_en.pairs('İSTANBUL'))
+        self.assertEqual(['I\u0307s', 'tan', 'bul'], h_en.syllables('İstanbul'))
+        # Words with '=' keep their case
+        self.assertEqual('Hy=phen', h_en.apply('Hy=phen', 16))
+        words = ['McDonald', 'Hyphenation', 'PowerPoint', 'BEAUTIFUL', 'İSTANBUL']
+        self.assertEqual([h_en.pairs(word) for word in words], h_en.pairs_many(words))
+        self.assertEqual([h_en.syllables(word) for word in words], h_en.syllables_many(words))
+
+        # Replacements of non-standard hyphenations take the case of the word
+        h_hu = Hyphenator('hu_HU')
+        self.assertEqual([['Asz', 'szonnyal'], ['Asszony', 'nyal']], h_hu.pairs('Asszonnyal'))
+        self.assertEqual([['ASZ', 'SZONNYAL'], ['ASSZONY', 'NYAL']], h_hu.pairs('ASSZONNYAL'))
+        self.assertEqual(['ASZ', 'SZONY', 'NYAL'], h_hu.syllables('ASSZONNYAL'))
+        self.assertEqual([['ASz', 'szonnyal'], ['ASszony', 'nyal']], h_hu.pairs('ASszonnyal'))
+        self.assertEqual((5, 8, 'NY', 'NY'),
+            h_hu.positions_many(['ASSZONNYAL'], nonstandard=True)[2][0, 6])
+
+    def test_pairs_from_syllables(self):
+        h_en = Hyphenator('en_US')
+        word = 'antidisestablishmentarianism'
+        syllables = h_en.syllables(word)
+
+        self.assertEqual(
+            [[''.join(syllables[:i]), ''.join(syllables[i:])]
+                for i in range(1, len(syllables))],
+            h_en.pairs(word)
+        )
+
+        self.assertEqual(
+            [[a.upper(), b.upper()] for a, b in h_en.pairs(word)],
+            h_en.pairs(word.upper())
+        )
+
+        # mode 5: title-case each part
+        self.assertEqual(
+            [['Beau', 'Tiful'], ['Beauti', 'Ful']],
+            h_en.apply('beautiful', 5)
+        )
+
+
+    def test_batch(self):
+        h_en = Hyphenator('en_US')
+        words = ['beautiful', 'PANDEMIC', 'the', 'hy=phen', 'beauty']
+
+        self.assertEqual(
+            [h_en.pairs(word) for word in words],
+            h_en.pairs_many(words)
+        )
+
+        self.assertEqual(
+            [h_en.syllables(word) for word in words],
+            h_en.syllables_many(iter(words))
+        )
+
+        with self.assertRaises(TypeError):
+            h_en.pairs_many(['beautiful', 42])
+
+    def test_positions(self):
+        h_en = Hyphenator('en_US')
+        words = ['beautiful', 'PANDEMIC', 'the', 'hyphenation']
+
+        self.assertEqual([4, 6], h_en.positions('beautiful').tolist())
+        self.assertEqual(0, len(h_en.positions('the')))
+
+        offsets, index, replacements = h_en.positions_many(words)
+        self.assertEqual(
+            [[len(pair[0]) for pair in h_en.pairs(word)] for word in words],
+            [offsets[index[i]:index[i + 1]].tolist() for i in range(len(words))]
+        )
+        self.assertEqual({}, replacements)
+
+    def test_positions_nonstandard(self):
+        h_hu = Hyphenator('hu_HU')
+        word = 'asszonnyal'
+        # 'asz-szonnyal' and 'asszony-nyal'
+        self.assertEqual([], h_hu.positions(word).tolist())
+
+        offsets, index, replacements = h_hu.positions_many([word], nonstandard=True)
+        pairs = []
+        for offset in offsets:
+            start, end, before, after = replacements[0, offset]
+            pairs.append([word[:start] + before, after + word[end:]])
+        self.assertEqual(h_hu.pairs(word), pairs)
+
+    def test_syllable_counts(self):
+        h_en = Hyphenator('en_US')
+        words = ['beautiful', 'PANDEMIC', 'the', 'hyphenation', 'a=b']
+
+        counts = h_en.syllable_counts(words)
+        self.assertEqual([len(h_en.syllables(word)) for word in words], counts.tolist())
+        self.assertEqual([3, 0], h_en.syllable_counts(['beautiful', 'the']).tolist())
+        self.assertEqual(0, len(h_en.syllable_counts([])))
+        with self.assertRaises(TypeError):
+            h_en.syllable_counts(['beautiful', 42])
+        # Words too long to be hyphenated do not fail the batch
+        long_word = 'x' * 200
+        with self.assertRaises(ValueError):
+            h_en.syllables_many([long_word])
+        self.assertEqual([3, 0, 3],
+            h_en.syllable_counts(['beautiful', long_word, 'hyphenation']).tolist())
+        masks, index = h_en.break_masks(['beautiful', long_word, 'hyphenation'])
+        self.assertEqual([0, 9, 209, 220], index.tolist())
+        self.assertEqual([0] * 200, masks[9:209].tolist())
+
+    def test_break_masks(self):
+        h_en = Hyphenator('en_US')
+        words = ['beautiful', 'PANDEMIC', 'the', 'hyphenation']
+
+        masks, index = h_en.break_masks(words)
+        self.assertEqual([0, 0, 0, 1, 0, 1, 0, 0, 0], masks[:9].tolist())
+        offsets, offsets_index, _ = h_en.positions_many(words)
+        for i, word in enumerate(words):
+            mask = masks[index[i]:index[i + 1]]
+            self.assertEqual(len(word), len(mask))
+            self.assertEqual(offsets[offsets_index[i]:offsets_index[i + 1]].tolist(),
+                [j + 1 for j, point in enumerate(mask) if point])
+
+        h_hu = Hyphenator('hu_HU')
+        # 'asz-szonnyal' and 'asszony-nyal'
+        self.assertEqual([0] * 10, h_hu.break_masks(['asszonnyal'])[0].tolist())
+        masks, index = h_hu.break_masks(['asszonnyal'], nonstandard=True)
+        self.assertEqual([2, 6], [j + 1 for j, point in enumerate(masks) if point == 2])
+
+    @unittest.skipUnless(importlib.util.find_spec('numpy'), 'requires numpy')
+    def test_numpy(self):
+        import numpy
+        h_en = Hyphenator('en_US')
+        counts = h_en.syllable_counts(['beautiful', 'hyphenation'])
+        self.assertEqual([3, 3], numpy.frombuffer(counts, numpy.uint8).tolist())
+        masks, index = h_en.break_masks(['beautiful', 'hyphenation'])
+        self.assertEqual(numpy.uint32, numpy.asarray(index).dtype)
+        self.assertEqual(20, len(numpy.asarray(masks)))
+
+    def test_map(self):
+        h_en = Hyphenator('en_US')
+        words = ['beautiful', 'hyphenation', 'PANDEMIC', 'the'] * 100
+
+        self.assertEqual(
+            h_en.syllables_many(words),
+            h_en.map(words, workers=4, chunksize=7)
+        )
+
+        self.assertEqual(
+            h_en.pairs_many(words),
+            h_en.map(iter(words), workers=2, method='pairs')
+        )
+
+    def test_cache(self):
+        h_en = Hyphenator('en_US', cache_size=2)
+        self.assertIsNone(Hyphenator('en_US').cache_info())
+
+        self.assertEqual(
+            [['beau', 'tiful'], ['beauti', 'ful']],
+            h_en.pairs('beautiful')
+        )
+        # Modifying results must not corrupt the cache
+        self.assertEqual(['beau-', 'tiful'], h_en.wrap('beautiful', 6))
+        self.assertEqual(
+            [['beau', 'tiful'], ['beauti', 'ful']],
+            h_en.pairs('beautiful')
+        )
+        self.assertEqual([['PAN', 'DEMIC']], h_en.pairs('PANDEMIC'))
+        self.assertEqual([['pan', 'demic']], h_en.pairs('pandemic'))
+        self.assertEqual(['beau', 'ti', 'ful'], h_en.syllables('beautiful'))
+
+        info = h_en.cache_info()
+        self.assertEqual((2, 4, 2, 2), tuple(info))
+        h_en.cache_clear()
+        self.assertEqual(0, h_en.cache_info().currsize)
+
+    def test_dict_path(self):
+        h_en = Hyphenator('en_US')
+        h_path = Hyphenator('en_US', directory='/nonexistent', dict_path=h_en.dict_path)
+        self.assertEqual(h_en.dict_path, h_path.dict_path)
+        self.assertEqual(h_en.pairs('beautiful'), h_path.pairs('beautiful'))
+
+    def test_pickle(self):
+        h_en = Hyphenator('en_US', lmin=3, cache_size=10)
+        # The unpickled hyphenator shares the loaded dictionary and installs nothing
+        with mock.patch.object(dictools, 'install', side_effect=AssertionError), \
+                mock.patch.object(hnj, 'dictionary_', side_effect=AssertionError):
+            h_copy = pickle.loads(pickle.dumps(h_en))
+        self.assertEqual([['beau', 'tiful'], ['beauti', 'ful']], h_copy.pairs('beautiful'))
+        self.assertEqual(h_en.pairs('hyphenation'), h_copy.pairs('hyphenation'))
+        self.assertEqual(10, h_copy.cache_info().maxsize)
+
+        with multiprocessing.get_context('spawn').Pool(1) as pool:
+            self.assertEqual(h_en.syllables('hyphenation'),
+                pool.apply(Hyphenator.syllables, (h_en, 'hyphenation')))
+
+    @unittest.skipUnless('fork' in multiprocessing.get_all_start_methods(), 'requires fork')
+    def test_fork(self):
+        h_en = Hyphenator('en_US', metrics=True)
+        # Forked processes use the dictionaries loaded by the parent, even if
+        # another thread held the lock of the registry when forking.
+        with mock.patch.object(hnj, 'dictionary_', side_effect=AssertionError), \
+                dictools._loaded_lock:
+            pool = multiprocessing.get_context('fork').Pool(1)
+        with pool:
+            self.assertEqual(h_en.pairs('hyphenation'),
+                pool.apply_async(Hyphenator.pairs, (h_en, 'hyphenation')).get(timeout=60))
+
+    def test_lazy_imports(self):
+        # Using an installed dictionary imports no network or XML modules
+        Hyphenator('en_US')
+        code = ('import sys, hyphen; hyphen.Hyphenator("en_US"); '
+            'print(*sorted({"requests", "urllib3", "asyncio", "xml.etree.ElementTree"} & set(sys.modules)))')
+        result = subprocess.run([sys.executable, '-c', code], check=True,
+            capture_output=True, text=True,
+            env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)))
+        self.assertEqual('', result.stdout.strip())
+
+    def test_metrics(self):
+        self.assertIsNone(Hyphenator('en_US').stats())
+        events = []
+        h_en = Hyphenator('en_US', metrics=lambda event, value: events.append(event))
+        h_en.pairs('beautiful')
+        h_en.pairs('the')
+        h_en.syllables('PANDEMIC')
+        h_en.pairs_many(['beautiful', 'hyphenation', 'the', 'a=bc', 'ab\ud800cd'])
+        h_en.positions_many(['beautiful', 'hyphenation'])
+        h_en.syllable_counts(['beautiful', 'x' * 200])
+        with self.assertRaises(hnj.WordTooLongError):
+            h_en.syllables('x' * 200)
+
+        stats = h_en.stats()
+        self.assertGreater(stats.pop('c_ns'), 0)
+        self.assertEqual({
+            'calls.pairs': 1,
+            'calls.syllables': 2,
+            'calls.pairs_many': 1,
+            'words.pairs_many': 5,
+            'calls.positions': 1,
+            'words.positions': 2,
+            'calls.syllable_counts': 1,
+            'words.syllable_counts': 2,
+            'rejected': 3,
+            'encode_errors': 1,
+            'too_long': 2,
+            }, stats)
+        self.assertEqual(sorted(set(events)), sorted(h_en.stats()))
+
+        # The counts are added to those of the dictionary
+        h_nl = Hyphenator('nl_NL', metrics=True, cache_size=10)
+        self.assertEqual([], h_nl.pairs('\u65e5\u672c\u8a9e\u306e\u5358\u8a9e'))
+        self.assertEqual(h_nl.pairs('fietsenmaker'), h_nl.pairs('fietsenmaker'))
+        stats = dictools.dictionary_stats()[os.path.realpath(dictools.loadable_path(h_nl.dict_path))]
+        self.assertGreater(stats['load_ns'], 0)
+        self.assertEqual(1, stats['encode_errors'])
+        self.assertEqual(2, stats['calls.pairs'])
+        # Cache hits do not call the C extension
+        self.assertEqual(1, h_nl.stats()['cache_hits'])
+        self.assertEqual(2, h_nl.stats()['calls.pairs'])
+
+    def test_encoding(self):
+        # UTF-8 (hu_HU) and ISO8859-1 (nl_NL) dictionaries, ASCII and other words
+        for language, words in (
+                ('hu_HU', ['asszonnyal', 'szerelem', 'gyönyörű', 'ŐSZIBARACK', '\U0001d518bcdef']),
+                ('nl_NL', ['fietsenmaker', 'coöperatie', 'ÉÉNDAGSVLIEG', '日本語の'])):
+            h = Hyphenator(language)
+            pairs = [h.pairs(word) for word in words]
+            self.assertEqual(pairs, h.pairs_many(words))
+            for word, word_pairs in zip(words, pairs):
+                for first, second in word_pairs:
+                    self.assertTrue(first and second)
+                self.assertEqual(
+                    [len(first) for first, second in word_pairs if first + second == word],
+                    h.positions(word).tolist())
+            self.assertEqual([], h.pairs('ab\ud800cdef'))
+        self.assertEqual([['gyö', 'nyörű'], ['gyönyö', 'rű']], Hyphenator('hu_HU').pairs('gyönyörű'))
+        self.assertEqual([['co', 'öperatie'], ['coö', 'peratie'], ['coöpe', 'ratie'],
+            ['coöpera', 'tie']], Hyphenator('nl_NL').pairs('coöperatie'))
+
+    def test_dense_transitions(self):
+        h_en = Hyphenator('en_US')
+        linear = hnj.hyphenator_(hnj.dictionary_(h_en.dict_path, 0), 2, 2, 2, 2)
+        dense = hnj.hyphenator_(hnj.dictionary_(h_en.dict_path, 1), 2, 2, 2, 2)
+        words = ['beautiful', 'hyphenation', 'incomprehensibilities', 'PANDEMIC']
+
+        self.assertEqual(linear.apply_batch(words, 1), dense.apply_batch(words, 1))
+        self.assertEqual(h_en.pairs_many(words), dense.apply_batch(words, 1))
+
+    def test_shared_dictionary(self):
+        h_en = Hyphenator('en_US')
+        h_en2 = Hyphenator('en_US', lmin=5, rmin=3)
+        self.assertIs(dictools.load(h_en.dict_path), dictools.load(h_en2.dict_path))
+        self.assertIn(os.path.realpath(dictools.loadable_path(h_en.dict_path)), dictools.list_loaded())
+
+        self.assertEqual([['beauti', 'ful']], h_en2.pairs('beautiful'))
+        self.assertEqual(
+            [['beau', 'tiful'], ['beauti', 'ful']],
+            h_en.pairs('beautiful')
+        )
+
+        dictools.evict(h_en.dict_path)
+        self.assertNotIn(os.path.realpath(dictools.loadable_path(h_en.dict_path)), dictools.list_loaded())
+        # Hyphenators keep evicted dictionaries alive
+        self.assertEqual([['beauti', 'ful']], h_en2.pairs('beautiful'))
+
+        # Hyphenators and dictionaries are shared by threads, and cannot be changed
+        dictionary = dictools.load(h_en.dict_path)
+        with self.assertRaises(RuntimeError):
+            h_en2.__hyphenate__.__init__(dictionary, 2, 2, 2, 2)
+        with self.assertRaises(RuntimeError):
+            dictionary.__init__(h_en.dict_path)
+        self.assertEqual([['beauti', 'ful']], h_en2.pairs('beautiful'))
+
+    def test_hyphenate_text(self):
+        h_en = Hyphenator('en_US')
+        text = 'A beautiful,\n\n  TERRIBLE  pandemic! ' + 'x' * 200 + '\n'
+
+        self.assertEqual(
+            ['A beau-ti-ful,\n', '\n', '  TER-RI-BLE  pan-demic! ' + 'x' * 200 + '\n'],
+            list(h_en.hyphenate_text(io.StringIO(text), hyphen='-'))
+        )
+        self.assertEqual(
+            'A beau\u00adti\u00adful,',
+            ''.join(h_en.hyphenate_text('A beautiful,'))
+        )
+        # Combining marks and apostrophes between letters belong to the word
+        text = unicodedata.normalize('NFD', 'A gyönyörű kert')
+        self.assertEqual(
+            unicodedata.normalize('NFD', 'A gyö-nyö-rű kert'),
+            ''.join(Hyphenator('hu_HU').hyphenate_text(text, hyphen='-'))
+        )
+        self.assertEqual("don't", ''.join(h_en.hyphenate_text("don't", hyphen='-')))
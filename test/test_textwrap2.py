@@ -1,3 +1,6 @@
+import itertools
+import os
+import tempfile
 import unittest
 import hyphen
 from hyphen import textwrap2
@@ -34,3 +37,115 @@ come up.""", wrapped)
 xxxxxxxxxxxx
 xx might
 come up.""", wrapped)
+
+    def test_narrow_column(self):
+        hyphenator = hyphen.Hyphenator("en_US")
+        calls = []
+
+        class CountingHyphenator:
+            def positions_many(self, words, nonstandard=False):
+                calls.extend(words)
+                return hyphenator.positions_many(words, nonstandard)
+
+        text = "An electroencephalographically sound idea"
+        expected = ["An elec-", "troen-", "cephalo-", "graphi-", "cally", "sound", "idea"]
+        self.assertEqual(expected, textwrap2.wrap(text, width=8, use_hyphenator=hyphenator))
+        self.assertEqual(expected, textwrap2.wrap(text, width=8, use_hyphenator=CountingHyphenator()))
+        # The long word is hyphenated only once.
+        self.assertEqual(1, calls.count("electroencephalographically"))
+
+    def test_optimal_fill(self):
+        hyphenator = hyphen.Hyphenator("en_US")
+        text = "A thing of beauty is a joy forever."
+        wrapped = textwrap2.fill(text, width=10, use_hyphenator=hyphenator,
+                                 break_mode="optimal")
+        # Minimum raggedness avoids the short line 'ever.'
+        self.assertEqual("""A thing
+of beauty
+is a joy
+forever.""", wrapped)
+
+        wrapped = textwrap2.fill("Some incomprehensibilities might come up.",
+                                 width=12, use_hyphenator=hyphenator,
+                                 break_mode="optimal", hyphen_penalty=0)
+        self.assertEqual("""Some
+incomprehen-
+sibilities
+might come
+up.""", wrapped)
+
+        # The first line is wider than the others and may take more words
+        self.assertEqual(["A thing of beauty", "    is a joy", "    forever."],
+            textwrap2.wrap(text, width=17, subsequent_indent="    ",
+                           break_mode="optimal"))
+
+        # Pieces of words broken at narrow widths leave room for the hyphen
+        text = "x revalidated incomprehensibilities self-evidently"
+        for width in range(2, 12):
+            lines = textwrap2.wrap(text, width, use_hyphenator=hyphenator,
+                                   break_mode="optimal")
+            self.assertEqual([], [line for line in lines if len(line) > width])
+
+        with self.assertRaises(ValueError):
+            textwrap2.TextWrapper(break_mode="best")
+
+    def test_incremental_wrapper(self):
+        hyphenator = hyphen.Hyphenator("en_US")
+        text = "A thing of beauty is a joy forever. " * 20
+        w = textwrap2.IncrementalWrapper(text, width=12, use_hyphenator=hyphenator)
+        self.assertEqual(textwrap2.wrap(text, width=12, use_hyphenator=hyphenator), w.lines)
+
+        lines = list(w.lines)
+        first, last, new_lines = w.edit(2, 7, "joy")
+        lines[first:last] = new_lines
+        self.assertEqual((0, 1, ["A joy of"]), (first, last, new_lines[:1]))
+        self.assertEqual(lines, w.lines)
+
+        for start, end, insert in [(300, 300, "incomprehensibilities "),
+                                   (100, 140, ""), (0, 0, "  "), (-1, -1, " Yes.")]:
+            if start < 0:
+                start = end = len(w.text)
+            w.edit(start, end, insert)
+            self.assertEqual(textwrap2.wrap(w.text, width=12, use_hyphenator=hyphenator), w.lines)
+
+        with self.assertRaises(ValueError):
+            textwrap2.IncrementalWrapper(text, max_lines=3)
+
+    def test_fill_many(self):
+        hyphenator = hyphen.Hyphenator("en_US")
+        texts = ["A thing of beauty is a joy forever.",
+                 "Some incomprehensibilities might come up."] * 5
+        with tempfile.TemporaryDirectory() as directory:
+            with open(hyphen.dictools.install('en_US'), 'rb') as f:
+                hyphen.dictools.Dictionaries(directory).add(
+                    'en_US', f.read(), ['en_US'], 'http://pouac.com')
+            self.assertEqual(
+                [textwrap2.fill(text, width=12, use_hyphenator=hyphenator) for text in texts],
+                list(textwrap2.fill_many(iter(texts), 12, "en_US", processes=2, chunksize=3,
+                    directory=directory, precompile=True))
+            )
+            # The dictionary is precompiled only if requested, and where it is installed
+            self.assertTrue(any(name.endswith('.hnjb') for name in os.listdir(directory)))
+        self.assertEqual(
+            [textwrap2.wrap(text, width=12) for text in texts],
+            list(textwrap2.wrap_many(texts, 12, processes=2))
+        )
+        # Hyphenators are pickled to the workers
+        self.assertEqual(
+            [textwrap2.wrap(text, width=12, use_hyphenator=hyphenator) for text in texts],
+            list(textwrap2.wrap_many(texts, 12, processes=2, use_hyphenator=hyphenator))
+        )
+
+    def test_fill_many_backpressure(self):
+        read = []
+
+        def texts():
+            for i in itertools.count():
+                read.append(i)
+                yield "text %d" % i
+
+        results = textwrap2.fill_many(texts(), 12, processes=2, chunksize=3)
+        self.assertEqual(["text %d" % i for i in range(10)], list(itertools.islice(results, 10)))
+        results.close()
+        # At most two chunks per worker are read ahead of the results
+        self.assertLessEqual(len(read), 12 + 2 * 2 * 3)